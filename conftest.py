@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_cache(django_test_environment):
+    """Кеш тестов во временном файле, как в manage.py test."""
+    from core.testing import isolated_cache
+
+    with isolated_cache():
+        yield
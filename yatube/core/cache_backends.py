@@ -0,0 +1,311 @@
+"""Двухуровневый кеш: LRU в памяти процесса поверх общего файла SQLite.
+
+L1 живет в процессе и отвечает без обращения к диску, L2 - файл SQLite,
+общий для всех процессов на машине. Каждая запись, которая
+перезаписывает или удаляет живой ключ (кроме incr счетчиков),
+увеличивает счетчик поколения в L2 и записывает ключ в журнал
+изменений; запись нового ключа их не трогает. Процесс сверяет свое
+поколение с общим не чаще раза в L1_CHECK_INTERVAL секунд и убирает
+из L1 только ключи из журнала, поэтому перезапись одного ключа не
+сбрасывает остальные копии. L1 сбрасывается целиком, только если
+процесс отстал больше, чем на CHANGE_LOG_SIZE изменений.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE TABLE IF NOT EXISTS cache_meta ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO cache_meta VALUES ('generation', 0)",
+    # key NULL - изменились все ключи (clear, вытеснение).
+    'CREATE TABLE IF NOT EXISTS cache_change ('
+    'generation INTEGER PRIMARY KEY, key TEXT)',
+)
+
+# L1 общий для всех потоков процесса: Django создает экземпляр
+# бэкенда на каждый поток.
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+def is_expired(expires, now):
+    return expires is not None and expires <= now
+
+
+class LocalLRU:
+    """Ограниченный LRU процесса с отметкой поколения L2."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = 0.0
+        self.writes = 0
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if is_expired(entry[1], now):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires):
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def observe(self, generation, changed=None):
+        """Запоминает поколение L2.
+
+        changed - ключи, измененные с прошлого поколения; None значит,
+        что они неизвестны, и L1 сбрасывается целиком.
+        """
+        with self.lock:
+            if generation != self.generation:
+                if changed is None:
+                    self.entries.clear()
+                else:
+                    for key in changed:
+                        self.entries.pop(key, None)
+                self.generation = generation
+            self.checked_at = time.monotonic()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.check_interval = options.get('L1_CHECK_INTERVAL', 1.0)
+        # Размер L2 пересчитывается раз в столько записей процесса.
+        self.cull_check_interval = options.get('CULL_CHECK_INTERVAL', 100)
+        self.change_log_size = options.get('CHANGE_LOG_SIZE', 10000)
+        with _local_caches_lock:
+            self.local = _local_caches.setdefault(
+                location, LocalLRU(options.get('L1_MAX_ENTRIES', 1000)))
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def _sync(self):
+        if time.monotonic() - self.local.checked_at < self.check_interval:
+            return
+        generation = self.connection.execute(
+            "SELECT value FROM cache_meta WHERE name = 'generation'"
+        ).fetchone()[0]
+        self._catch_up(generation)
+
+    def _catch_up(self, generation):
+        """Убирает из L1 ключи, измененные до поколения generation."""
+        known = self.local.generation
+        if known is None or generation == known:
+            self.local.observe(generation)
+            return
+        rows = self.connection.execute(
+            'SELECT generation, key FROM cache_change '
+            'WHERE generation > ? AND generation <= ? ORDER BY generation',
+            (known, generation)).fetchall()
+        changed = [key for _, key in rows]
+        if len(rows) != generation - known or None in changed:
+            # Журнал уже обрезан или менялось все: копии не проверить.
+            changed = None
+        self.local.observe(generation, changed)
+
+    def _bump(self, key=None):
+        """Сдвигает поколение внутри открытой транзакции записи.
+
+        key - измененный ключ, None - изменились все.
+        """
+        self.connection.execute(
+            "UPDATE cache_meta SET value = value + 1 "
+            "WHERE name = 'generation'")
+        generation = self.connection.execute(
+            "SELECT value FROM cache_meta WHERE name = 'generation'"
+        ).fetchone()[0]
+        self.connection.execute(
+            'INSERT INTO cache_change VALUES (?, ?)', (generation, key))
+        self._catch_up(generation)
+
+    @contextmanager
+    def _transaction(self):
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _write(self, sql, params, bump=True, key=None):
+        with self._transaction() as connection:
+            rowcount = connection.execute(sql, params).rowcount
+            if bump and rowcount:
+                self._bump(key)
+        return rowcount
+
+    def _load(self, key, now):
+        row = self.connection.execute(
+            'SELECT value, expires FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or is_expired(row[1], now):
+            return None
+        self.local.set(key, row[0], row[1])
+        return row[0]
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        now = time.time()
+        pickled = self.local.get(key, now)
+        if pickled is None:
+            pickled = self._load(key, now)
+        if pickled is None:
+            return default
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        self._cull()
+        with self._transaction() as connection:
+            # INSERT OR REPLACE всегда сообщает об одной строке, поэтому
+            # живую запись ищем заранее: только ее копии могут быть
+            # в чужих L1.
+            replaced = connection.execute(
+                'SELECT 1 FROM cache_entry WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?)',
+                (key, pickled, expires))
+            if replaced:
+                self._bump(key)
+        self.local.set(key, pickled, expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        self._cull()
+        # Просроченную запись add перезаписывает. Поколение не
+        # сдвигается: чужие L1 сами не отдадут просроченное значение.
+        # В свой L1 значение не кладется: через add заводят счетчики,
+        # которые потом меняет incr.
+        added = self._write(
+            'INSERT INTO cache_entry VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entry.expires <= ?',
+            (key, pickled, expires, time.time()), bump=False)
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        touched = self._write(
+            'UPDATE cache_entry SET expires = ? WHERE key = ?',
+            (self.get_backend_timeout(timeout), key), key=key)
+        self.local.pop(key)
+        return bool(touched)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        deleted = self._write(
+            'DELETE FROM cache_entry WHERE key = ?', (key,), key=key)
+        self.local.pop(key)
+        return bool(deleted)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно меняет счетчик в L2.
+
+        Поколение не сдвигается, иначе каждый счетчик просмотров или
+        лимита запросов сбрасывал бы L1 всех процессов. Счетчики
+        читают через сам incr, поэтому в чужих L1 их копий нет.
+        """
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or is_expired(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+        self.local.pop(key)
+        return value
+
+    def clear(self):
+        self._write('DELETE FROM cache_entry', ())
+        self.local.clear()
+
+    def _cull(self):
+        """Чистит L2, если он переполнен.
+
+        Строки считаются не на каждую запись, а раз в
+        CULL_CHECK_INTERVAL записей процесса, так что L2 может ненадолго
+        превысить MAX_ENTRIES. Заодно из журнала изменений убираются
+        записи старше CHANGE_LOG_SIZE поколений.
+        """
+        with self.local.lock:
+            self.local.writes += 1
+            if self.local.writes < self.cull_check_interval:
+                return
+            self.local.writes = 0
+        count = self.connection.execute(
+            'SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        self._write(
+            'DELETE FROM cache_change WHERE generation <= '
+            '(SELECT MAX(generation) FROM cache_change) - ?',
+            (self.change_log_size,), bump=False)
+        if count < self._max_entries:
+            return
+        self._write(
+            'DELETE FROM cache_entry WHERE expires <= ?', (time.time(),),
+            bump=False)
+        self._write(
+            'DELETE FROM cache_entry WHERE key IN ('
+            'SELECT key FROM cache_entry '
+            'ORDER BY expires IS NULL, expires LIMIT ?)',
+            (count // self._cull_frequency,))
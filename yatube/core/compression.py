@@ -0,0 +1,95 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .staticfiles import accepted_encodings, brotli
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+
+
+def gzip_compressor(level):
+    # wbits=31: zlib-поток в обертке gzip.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (compressor.compress,
+            lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush)
+
+
+def brotli_compressor(quality):
+    compressor = brotli.Compressor(quality=quality)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def get_compressor(encoding):
+    """(compress, flush, finish) для выбранного кодирования."""
+    if encoding == 'br':
+        return brotli_compressor(settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip_compressor(settings.COMPRESSION_LEVEL)
+
+
+def compress_bytes(data, encoding):
+    compress, _, finish = get_compressor(encoding)
+    return compress(data) + finish()
+
+
+def compress_stream(chunks, encoding):
+    """Сжимает поток по кускам, не дожидаясь конца ответа."""
+    compress, flush, finish = get_compressor(encoding)
+    for chunk in chunks:
+        data = compress(chunk)
+        # Сбрасываем буфер, чтобы клиент получал данные по мере генерации.
+        data += flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def choose_encoding(request):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    """Сжимает ответы gzip или brotli, включая потоковые.
+
+    Ответы короче COMPRESSION_MIN_SIZE, уже сжатые, частичные (206) и
+    не текстовые не трогаются. Сильный ETag становится слабым: байты
+    ответа меняются, а смысл - нет.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.status_code != 200
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+                return response
+            compressed = compress_bytes(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,43 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def pin_to_primary():
+    """Все последующие чтения в этом потоке идут в основную базу."""
+    _state.pinned = True
+
+
+def unpin():
+    _state.pinned = False
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+class PrimaryReplicaRouter:
+    """Чтение - из реплик, запись - в основную базу.
+
+    После записи поток закрепляется за основной базой, чтобы
+    запрос видел собственные изменения.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or is_pinned():
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,68 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+MISSING = object()
+
+
+class LookupCache:
+    """Ограниченный LRU с TTL в памяти процесса для поиска объектов по ключу.
+
+    Записи помечены поколением из общего кеша: invalidate в любом
+    процессе меняет поколение, и остальные процессы перечитывают объект
+    при следующем обращении. Отсутствие объекта не кешируется, иначе
+    только что созданный объект не находился бы до конца ttl.
+    """
+    def __init__(self, name, maxsize, ttl):
+        self.generation_key = f'lookup_generation.{name}'
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_pk = {}
+        self.lock = threading.Lock()
+
+    def generation(self):
+        return cache.get_or_set(
+            self.generation_key, lambda: uuid.uuid4().hex, None)
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        generation = self.generation()
+        with self.lock:
+            entry = self.entries.get(key, MISSING)
+            if (entry is not MISSING and entry[1] > now
+                    and entry[2] == generation):
+                self.entries.move_to_end(key)
+                return entry[0]
+        value = loader()
+        if value is None:
+            return None
+        with self.lock:
+            self.entries[key] = (value, now + self.ttl, generation)
+            self.entries.move_to_end(key)
+            self.keys_by_pk[value.pk] = key
+            while len(self.entries) > self.maxsize:
+                _, (old_value, _, _) = self.entries.popitem(last=False)
+                self.keys_by_pk.pop(old_value.pk, None)
+        return value
+
+    def invalidate(self, key=None, pk=None):
+        """Сбрасывает запись по ключу и запись объекта с этим pk.
+
+        Без аргументов только меняет поколение: так сбрасываются все
+        записи во всех процессах.
+        """
+        cache.set(self.generation_key, uuid.uuid4().hex, None)
+        with self.lock:
+            if pk is not None and pk in self.keys_by_pk:
+                self.entries.pop(self.keys_by_pk.pop(pk), None)
+            if key is not None:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_pk.clear()
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.compression import brotli, brotli_compressor, gzip_compressor
+
+DEFAULT_URLS = ('/', )
+
+
+class Command(BaseCommand):
+    help = ('Замеряет, сколько времени CPU стоит сжатие страниц '
+            'и сколько байт оно экономит.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*',
+                            help='Адреса страниц; по умолчанию главная, '
+                                 'первая группа, профиль и пост.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or self.default_urls()
+        variants = [(f'gzip-{level}', gzip_compressor, level)
+                    for level in (1, 6, 9)]
+        if brotli is not None:
+            variants += [(f'br-{quality}', brotli_compressor, quality)
+                         for quality in (4, 5, 11)]
+        client = Client()
+        self.stdout.write(
+            f'{"url":<30} {"вариант":<9} {"байт":>9} {"сжато":>9} '
+            f'{"экономия":>9} {"мс":>8}')
+        for url in urls:
+            response = client.get(url)
+            if response.streaming:
+                body = b''.join(response.streaming_content)
+            else:
+                body = response.content
+            for name, factory, level in variants:
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    compress, _, finish = factory(level)
+                    compressed = compress(body) + finish()
+                elapsed = (time.perf_counter() - started) / options['repeat']
+                saved = 1 - len(compressed) / max(len(body), 1)
+                self.stdout.write(
+                    f'{url:<30} {name:<9} {len(body):>9} '
+                    f'{len(compressed):>9} {saved:>8.1%} '
+                    f'{elapsed * 1000:>8.3f}')
+
+    def default_urls(self):
+        from posts.models import Group, Post
+
+        urls = list(DEFAULT_URLS)
+        group = Group.objects.first()
+        if group:
+            urls.append(f'/group/{group.slug}/')
+        post = Post.objects.select_related('author').first()
+        if post:
+            urls.append(f'/profile/{post.author.username}/')
+            urls.append(f'/posts/{post.pk}/')
+        return urls
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в файлы реплик. '
+            'Нужна для локальной проверки чтения из реплик.')
+
+    def handle(self, *args, **options):
+        source = connections['default'].settings_dict
+        if 'sqlite3' not in source['ENGINE']:
+            raise CommandError('Команда работает только с SQLite.')
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('Реплики не настроены (DATABASE_REPLICAS).')
+        src = sqlite3.connect(source['NAME'])
+        try:
+            for alias in replicas:
+                target = connections[alias].settings_dict['NAME']
+                dst = sqlite3.connect(target)
+                try:
+                    # backup() копирует страницы консистентно даже
+                    # при параллельной записи в основную базу.
+                    src.backup(dst)
+                finally:
+                    dst.close()
+                self.stdout.write(f'{alias}: {target}')
+        finally:
+            src.close()
@@ -0,0 +1,105 @@
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+from sorl.thumbnail import get_thumbnail
+
+from posts.models import GroupStats, Post, ProfileStats
+
+# "GET /path?query HTTP/1.1" 200 - формат access-логов nginx и gunicorn.
+LOG_LINE_RE = re.compile(r'"GET (?P<path>\S+) HTTP/[\d.]+" 200 ')
+# Размеры должны совпадать с {% thumbnail %} в шаблонах постов.
+THUMBNAIL_OPTIONS = (
+    ('960x540', {'crop': 'center', 'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+
+def top_paths_from_log(path, limit):
+    counter = Counter()
+    with open(path, errors='replace') as log:
+        for line in log:
+            match = LOG_LINE_RE.search(line)
+            if match and not match['path'].startswith(
+                    (settings.STATIC_URL, settings.MEDIA_URL)):
+                counter[match['path']] += 1
+    return [path for path, _ in counter.most_common(limit)]
+
+
+class Command(BaseCommand):
+    help = ('Прогревает кеш после деплоя: прогоняет популярные адреса '
+            'через WSGI-приложение и заранее строит миниатюры.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--access-log',
+                            help='Взять самые частые адреса из access-лога.')
+        parser.add_argument('--top', type=int, default=50,
+                            help='Сколько адресов брать из лога и из базы.')
+        parser.add_argument('--host', default=settings.CACHE_WARM_HOST,
+                            help='Хост сайта: он входит в ключ кеша страниц.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--thumbnail-pages', type=int, default=3,
+                            help='Для скольких страниц главной строить '
+                                 'миниатюры.')
+
+    def handle(self, *args, **options):
+        paths = list(settings.CACHE_WARM_URLS)
+        if options['access_log']:
+            paths += top_paths_from_log(options['access_log'],
+                                        options['top'])
+        paths += self.popular_paths(options['top'])
+        paths = list(dict.fromkeys(paths))
+        self.host = options['host']
+        self.application = get_wsgi_application()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            for path, status in zip(paths, pool.map(self.request, paths)):
+                self.stdout.write(f'{status} {path}')
+        built = self.build_thumbnails(options['thumbnail_pages'])
+        self.stdout.write(f'Прогрето адресов: {len(paths)}, '
+                          f'миниатюр: {built}')
+
+    def popular_paths(self, limit):
+        # Готовые счетчики GroupStats вместо подсчета по таблице постов.
+        groups = (GroupStats.objects.order_by('-posts_count')
+                  .values_list('group__slug', flat=True))
+        authors = (ProfileStats.objects.order_by('-followers_count')
+                   .values_list('user__username', flat=True))
+        return ([f'/group/{slug}/' for slug in groups[:limit]]
+                + [f'/profile/{name}/' for name in authors[:limit]])
+
+    def request(self, path):
+        path, _, query = path.partition('?')
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query,
+                   'REQUEST_METHOD': 'GET', 'HTTP_HOST': self.host}
+        setup_testing_defaults(environ)
+        statuses = []
+        try:
+            body = self.application(
+                environ, lambda status, headers, exc_info=None:
+                statuses.append(status))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                body.close()
+        finally:
+            close_old_connections()
+        return statuses[0] if statuses else '-'
+
+    def build_thumbnails(self, pages):
+        built = 0
+        posts = Post.objects.exclude(image='').only('image')
+        for post in posts[:pages * settings.PAGE_SIZE]:
+            for geometry, thumbnail_options in THUMBNAIL_OPTIONS:
+                try:
+                    get_thumbnail(post.image, geometry, **thumbnail_options)
+                except OSError:
+                    # Файл картинки потерян - пропускаем.
+                    continue
+                built += 1
+        return built
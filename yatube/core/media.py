@@ -0,0 +1,128 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Имена по хешу: картинки постов (sha256) и миниатюры sorl (md5).
+# Содержимое под таким именем никогда не меняется.
+HASHED_NAME_RE = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{32}|[0-9a-f]{64})'
+    r'(\.\w+)?$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """Один диапазон 'bytes=a-b' -> (start, end) включительно.
+
+    Возвращает None, если заголовка нет или диапазонов несколько
+    (тогда отдается весь файл), и False, если диапазон невыполним.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def cache_headers(path, stat):
+    hashed = HASHED_NAME_RE.search(path)
+    if hashed:
+        etag = f'"{hashed.group("digest")}"'
+        cache_control = (
+            f'public, max-age={settings.MEDIA_MAX_AGE}, immutable')
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        cache_control = 'public, max-age=0, must-revalidate'
+    return {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+
+
+def sendfile_response(path, full_path, content_type):
+    """Пустой ответ: файл, в том числе диапазоны, отдает веб-сервер."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + path.lstrip('/'))
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, full_path, size, etag, content_type):
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        read_range(full_path, start, end - start + 1),
+        status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдает файлы MEDIA_ROOT с ETag, Range и отдачей через веб-сервер."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    headers = cache_headers(path, stat)
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        content_type = (mimetypes.guess_type(full_path)[0]
+                        or 'application/octet-stream')
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(path, full_path, content_type)
+        else:
+            response = file_response(request, full_path, stat.st_size,
+                                     headers['ETag'], content_type)
+    if response.status_code != 416:
+        for header, value in headers.items():
+            response[header] = value
+    return response
@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from .db_router import pin_to_primary, unpin
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReadYourWritesMiddleware:
+    """Закрепляет сессию за основной базой на время после записи.
+
+    После любого изменяющего запроса клиент получает cookie, и пока
+    она жива, его чтения не уходят в реплику, которая может отставать.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie_name = settings.REPLICA_PIN_COOKIE_NAME
+        wrote = request.method not in SAFE_METHODS
+        if wrote or cookie_name in request.COOKIES:
+            pin_to_primary()
+        try:
+            response = self.get_response(request)
+        finally:
+            unpin()
+        if wrote:
+            response.set_cookie(
+                cookie_name, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
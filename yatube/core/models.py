@@ -1,4 +1,10 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .storage import content_storage
 
 
 class CreatedModel(models.Model):
@@ -11,3 +17,65 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class MediaBlob(models.Model):
+    """Счетчик ссылок на файл в ContentAddressedStorage."""
+    name = models.CharField(max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name):
+        if not content_storage.is_content_name(name):
+            return
+        with transaction.atomic():
+            updated = cls.objects.filter(name=name).update(
+                refs=models.F('refs') + 1)
+            if not updated:
+                cls.objects.create(name=name, refs=1)
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку; файл без ссылок удаляется после коммита."""
+        if not content_storage.is_content_name(name):
+            return
+        cls.objects.filter(name=name, refs__gt=0).update(
+            refs=models.F('refs') - 1)
+        transaction.on_commit(lambda: cls.purge(name))
+
+    @classmethod
+    def release_many(cls, names):
+        """Снимает по ссылке за каждое имя одним UPDATE на кратность."""
+        names = Counter(
+            name for name in names if content_storage.is_content_name(name))
+        by_count = {}
+        for name, count in names.items():
+            by_count.setdefault(count, []).append(name)
+        with transaction.atomic():
+            for count, group in by_count.items():
+                cls.objects.filter(name__in=group, refs__gte=count).update(
+                    refs=models.F('refs') - count)
+        for name in names:
+            transaction.on_commit(lambda name=name: cls.purge(name))
+
+    @classmethod
+    def purge(cls, name):
+        """Удаляет файл, если на него так и не появилось ссылок.
+
+        Запись с нулем ссылок живет до этого момента, поэтому
+        одновременный acquire увеличивает ее, а не заводит новую.
+        Условный DELETE блокирует строку, и файл стирается только
+        вместе с ней в одной транзакции. Миниатюры файла и их записи
+        в key-value хранилище sorl удаляются вместе с ним.
+        """
+        with transaction.atomic():
+            deleted, _ = cls.objects.filter(name=name, refs=0).delete()
+            if deleted:
+                delete_with_thumbnails(ImageFile(name, content_storage))
@@ -0,0 +1,112 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def page_version(*key_prefixes):
+    """Версия страниц с этими префиксами.
+
+    Страница, собранная из нескольких объектов, кешируется под общей
+    версией их префиксов: сброс любого из них меняет версию.
+    """
+    keys = [f'swr_version.{prefix}' for prefix in key_prefixes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = cache.get_or_set(
+                key, lambda: uuid.uuid4().hex, None)
+    version = '.'.join(versions[key] for key in keys)
+    if len(keys) > 1:
+        version = hashlib.md5(version.encode('utf-8')).hexdigest()
+    return version
+
+
+def invalidate_pages(*key_prefixes):
+    """Сбрасывает все закешированные страницы с этими префиксами."""
+    cache.set_many(
+        {f'swr_version.{prefix}': uuid.uuid4().hex
+         for prefix in key_prefixes},
+        None)
+
+
+def page_cache_key(request, key_prefix):
+    url = hashlib.md5(
+        request.build_absolute_uri().encode('utf-8')).hexdigest()
+    prefixes = key_prefix if isinstance(key_prefix, tuple) else (key_prefix,)
+    key_prefix = prefixes[0]
+    version = page_version(*prefixes)
+    # В шапке страницы есть имя вошедшего, поэтому каждый вошедший
+    # получает свою копию, а анонимы делят одну.
+    user = getattr(request, 'user', None)
+    viewer = user.pk if user is not None and user.is_authenticated else 0
+    return (f'swr_page.{key_prefix}.{version}.{viewer}.'
+            f'{request.method}.{url}')
+
+
+def is_cacheable(request, response):
+    return (request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', ''))
+
+
+def serve_cached(request, key, timeout, stale_timeout, render):
+    entry = cache.get(key)
+    if entry is not None:
+        response, fresh_until = entry
+        if time.time() < fresh_until:
+            return response
+        if not cache.add(key + '.lock', 1,
+                         settings.PAGE_CACHE_LOCK_TIMEOUT):
+            # Страницу уже пересобирает другой запрос.
+            return response
+    try:
+        response = render()
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if is_cacheable(request, response):
+            cache.set(key, (response, time.time() + timeout),
+                      timeout + stale_timeout)
+    finally:
+        if entry is not None:
+            cache.delete(key + '.lock')
+    return response
+
+
+def cache_page_swr(timeout, stale_timeout=None, key_prefix='',
+                   anonymous_only=False):
+    """Как cache_page, но с отдачей устаревшей копии на время пересборки.
+
+    Через timeout секунд копия считается устаревшей: первый запрос
+    берет короткую блокировку и пересобирает страницу, остальные
+    в это время получают старую копию, а не рендерят страницу
+    параллельно. Совсем старая копия живет еще stale_timeout секунд.
+
+    key_prefix может быть функцией от аргументов представления: тогда
+    страницы одного объекта сбрасываются отдельно через
+    invalidate_pages. Функция может вернуть кортеж префиксов, если
+    страница зависит от нескольких объектов. С anonymous_only
+    кешируется только вариант страницы для анонимов, остальные запросы
+    идут в представление.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.PAGE_CACHE_STALE_TIMEOUT
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if anonymous_only and request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+            prefix = key_prefix
+            if callable(prefix):
+                prefix = prefix(request, *args, **kwargs)
+            return serve_cached(
+                request, page_cache_key(request, prefix), timeout,
+                stale_timeout, lambda: view_func(request, *args, **kwargs))
+        return wrapper
+    return decorator
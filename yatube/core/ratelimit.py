@@ -0,0 +1,86 @@
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60)."""
+    limit, period = rate.split('/')
+    return int(limit), PERIODS[period]
+
+
+def client_key(request):
+    """Пользователь из сессии или IP - без запроса к таблице User."""
+    user_id = request.session.get(SESSION_KEY)
+    if user_id:
+        return f'user:{user_id}'
+    return f'ip:{request.META.get("REMOTE_ADDR")}'
+
+
+def parse_limit(value):
+    """'10/m' или ('10/m', методы) -> (10, 60, методы).
+
+    По умолчанию считаются только изменяющие запросы, методы нужно
+    указывать для представлений, которые меняют данные по GET.
+    """
+    if isinstance(value, str):
+        value = (value, UNSAFE_METHODS)
+    rate, methods = value
+    return (*parse_rate(rate), methods)
+
+
+def take_token(key, limit, period):
+    """Засчитывает запрос; возвращает 0 или сколько секунд ждать.
+
+    Окно фиксированное: запросы считаются счетчиком в кеше под ключом
+    текущего интервала period. Счетчик заводится через add и растет
+    через incr, оба атомарны в L2, поэтому одновременные запросы
+    одного клиента не пройдут сверх limit.
+    """
+    now = time.time()
+    window = int(now // period)
+    cache_key = f'ratelimit:{key}:{window}'
+    # Счетчик живет до конца своего окна, дальше он не нужен.
+    cache.add(cache_key, 0, period)
+    try:
+        count = cache.incr(cache_key)
+    except ValueError:
+        # Запись вытеснили между add и incr - окно начинается заново.
+        cache.add(cache_key, 1, period)
+        count = 1
+    if count <= limit:
+        return 0
+    return max(1, math.ceil((window + 1) * period - now))
+
+
+class RateLimitMiddleware:
+    """Ограничивает частоту запросов к URL из settings.RATELIMITS."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        value = settings.RATELIMITS.get(match.view_name) if match else None
+        if value is None:
+            return None
+        limit, period, methods = parse_limit(value)
+        if request.method not in methods:
+            return None
+        retry_after = take_token(
+            f'{match.view_name}:{client_key(request)}', limit, period)
+        if not retry_after:
+            return None
+        response = HttpResponse('Слишком много запросов, попробуйте позже.',
+                                status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
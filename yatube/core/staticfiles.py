@@ -0,0 +1,116 @@
+import gzip
+import logging
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json',
+                           '.map', '.xml', '.ico')
+# Имя после ManifestStaticFilesStorage: style.0123456789ab.css
+HASHED_STATIC_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+logger = logging.getLogger(__name__)
+
+
+def compress_file(path):
+    """Пишет рядом с файлом .gz и, если есть brotli, .br-варианты."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        # Сжатие, которое ничего не дает, только тратит диск.
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """Имена с хешем содержимого, манифест и заранее сжатые варианты."""
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in names:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                compress_file(self.path(name))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                # Манифест есть, но файла в нем нет: сборка устарела,
+                # имя без хеша закешировалось бы браузером навсегда.
+                raise
+            # collectstatic еще не запускали (разработка, тесты) -
+            # ссылаемся на файл без хеша и предупреждаем об этом.
+            if not getattr(self, 'warned_no_manifest', False):
+                logger.warning(
+                    'Нет манифеста статики в %s, файлы отдаются без хеша. '
+                    'Запустите collectstatic.', self.location)
+                self.warned_no_manifest = True
+            return name
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            accepted.add(coding.strip())
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """Отдает STATIC_ROOT, выбирая сжатый вариант по Accept-Encoding."""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding, serve_path = None, full_path
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and os.path.isfile(full_path + suffix):
+            encoding, serve_path = coding, full_path + suffix
+            break
+    stat = os.stat(serve_path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        content_type = (mimetypes.guess_type(full_path)[0]
+                        or 'application/octet-stream')
+        response = FileResponse(open(serve_path, 'rb'),
+                                content_type=content_type)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    if HASHED_STATIC_RE.search(path):
+        response['Cache-Control'] = (
+            f'public, max-age={settings.STATIC_MAX_AGE}, immutable')
+    else:
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME_RE = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы по sha256 содержимого: posts/ab/cd/<sha256>.jpg.
+
+    Одинаковые загрузки превращаются в один файл, а вложенные каталоги
+    по префиксу хеша не дают одному каталогу разрастись до миллионов
+    файлов. Сколько записей ссылается на файл, считает core.MediaBlob.
+    """
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+
+    def is_content_name(self, name):
+        return bool(name) and CONTENT_NAME_RE.search(name) is not None
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        # Одновременная загрузка того же содержимого не должна получить
+        # имя с суффиксом: файл пишется под временным именем и
+        # атомарно переносится, совпавший файл просто заменяется.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,41 @@
+"""Окружение тестов: отдельный файл кеша на каждый прогон.
+
+L2 кеша - файл на диске, и без подмены тесты видели бы страницы,
+закешированные сервером разработки или прошлыми прогонами с другой
+базой.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated_cache():
+    """Переводит кеш по умолчанию во временный файл и удаляет его."""
+    directory = tempfile.mkdtemp(prefix='yatube_test_cache_')
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """manage.py test с кешем из isolated_cache."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_stack = ExitStack()
+        self.cache_stack.enter_context(isolated_cache())
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_stack.close()
+        super().teardown_test_environment(**kwargs)
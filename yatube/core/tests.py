@@ -1,4 +1,28 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache_backends import LocalLRU, TwoTierCache
+from core.db_router import PrimaryReplicaRouter, unpin
+from core.lookup_cache import LookupCache
+from core.models import MediaBlob
+from core.page_cache import (cache_page_swr, invalidate_pages,
+                             page_cache_key)
+from core.ratelimit import take_token
+from core.staticfiles import CompressedManifestStorage
+from core.storage import content_storage
+from core.utils import ELLIPSIS, WindowedPaginator
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +32,541 @@ class ViewTestClass(TestCase):
         self.assertEqual(response.status_code, 404)
         # Проверка, что используется шаблон core/404.html
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        unpin()
+
+    def tearDown(self):
+        unpin()
+
+    def test_reads_go_to_replica(self):
+        """Чтение без предшествующей записи идет в реплику."""
+        self.assertEqual(self.router.db_for_read(None), 'replica')
+
+    def test_write_pins_reads_to_primary(self):
+        """После записи поток читает из основной базы."""
+        self.assertEqual(self.router.db_for_write(None), 'default')
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def routed_reads(self, url):
+        """Куда роутер направил чтения запроса (сами они идут в default,
+        реплики в тестах нет)."""
+        routed = []
+        route = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            routed.append(route(router, model, **hints))
+            return 'default'
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', record):
+            self.client.get(url)
+        return set(routed)
+
+    def test_pin_cookie_after_post(self):
+        """После POST клиент получает cookie и читает из основной базы."""
+        cache.clear()
+        url = reverse('posts:index')
+        self.assertEqual(self.routed_reads(url), {'replica'})
+        response = self.client.post('/nonexist-page/')
+        self.assertIn('primary_pin', response.cookies)
+        cache.clear()
+        self.assertEqual(self.routed_reads(url), {'default'})
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Без реплик все идет в основную базу."""
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+
+@override_settings(RATELIMITS={'posts:profile_follow': ('2/m', ('GET',)),
+                               'posts:post_create': '1/m'})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.client.force_login(User.objects.create_user(username='bot'))
+        self.url = reverse('posts:profile_follow', args=('author',))
+
+    def test_limit_returns_429(self):
+        """Сверх лимита возвращается 429 с Retry-After."""
+        for _ in range(2):
+            self.assertEqual(self.client.get(self.url).status_code, 302)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_limit_is_per_client(self):
+        """Лимит считается отдельно для каждого клиента."""
+        for _ in range(3):
+            self.client.get(self.url)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_safe_methods_are_not_counted(self):
+        """Открытие формы не считается, отправка - считается."""
+        url = reverse('posts:post_create')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(url, {'text': 'Пост'})
+        self.assertEqual(
+            self.client.post(url, {'text': 'Еще'}).status_code, 429)
+
+    def test_window_resets(self):
+        """В новом окне счет запросов начинается заново."""
+        with mock.patch('core.ratelimit.time.time', return_value=120.0):
+            self.assertEqual(take_token('window', 1, 60), 0)
+            self.assertEqual(take_token('window', 1, 60), 60)
+        with mock.patch('core.ratelimit.time.time', return_value=179.5):
+            self.assertEqual(take_token('window', 1, 60), 1)
+        with mock.patch('core.ratelimit.time.time', return_value=180.0):
+            self.assertEqual(take_token('window', 1, 60), 0)
+
+    def test_limit_holds_when_requests_interleave(self):
+        """Запрос, влезший между чтением и записью, не обходит лимит."""
+        results = []
+        started = []
+        read, add = cache.get, cache.add
+
+        def competitor():
+            # Второй процесс успевает целиком после первого обращения
+            # к кешу.
+            if not started:
+                started.append(True)
+                results.append(take_token('race', 1, 60))
+
+        def interleaved_get(*args, **kwargs):
+            value = read(*args, **kwargs)
+            competitor()
+            return value
+
+        def interleaved_add(*args, **kwargs):
+            added = add(*args, **kwargs)
+            competitor()
+            return added
+        with mock.patch.object(cache, 'get', interleaved_get), \
+                mock.patch.object(cache, 'add', interleaved_add):
+            results.append(take_token('race', 1, 60))
+        self.assertEqual(sorted(result == 0 for result in results),
+                         [False, True])
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = 'posts/ab/cd/' + 'ab' * 32 + '.txt'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED_NAME, 'posts/plain.txt'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_hashed_name_is_immutable(self):
+        """Файл с хешем в имени кешируется навсегда, ETag - хеш."""
+        response = self.client.get('/media/' + HASHED_NAME)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/' + HASHED_NAME,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_request(self):
+        """Запрос диапазона возвращает 206 и кусок файла."""
+        response = self.client.get('/media/posts/plain.txt',
+                                   HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        response = self.client.get('/media/posts/plain.txt',
+                                   HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """Отдача файла передается nginx."""
+        response = self.client.get('/media/posts/plain.txt')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/plain.txt')
+
+    def test_path_traversal(self):
+        """Файлы вне MEDIA_ROOT недоступны."""
+        response = self.client.get('/media/../manage.py')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def save(self, data):
+        return content_storage.save('posts/file.txt', ContentFile(data))
+
+    def test_acquire_before_purge_keeps_file(self):
+        """Ссылка, взятая до удаления файла, его сохраняет."""
+        name = self.save(b'shared')
+        MediaBlob.acquire(name)
+        MediaBlob.release(name)
+        MediaBlob.acquire(name)
+        MediaBlob.purge(name)
+        self.assertTrue(content_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+        MediaBlob.release(name)
+        MediaBlob.purge(name)
+        self.assertFalse(content_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_concurrent_identical_upload(self):
+        """Файл, появившийся после проверки, не дает имени с суффиксом."""
+        name = self.save(b'same')
+        directory = os.path.dirname(content_storage.path(name))
+        with mock.patch.object(content_storage, 'exists',
+                               return_value=False):
+            self.assertEqual(self.save(b'same'), name)
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+        content_storage.delete(name)
+
+
+STATIC_SOURCE = tempfile.mkdtemp(dir=settings.BASE_DIR)
+STATIC_TARGET = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    STATICFILES_DIRS=[STATIC_SOURCE],
+    STATIC_ROOT=STATIC_TARGET,
+    STATICFILES_FINDERS=[
+        'django.contrib.staticfiles.finders.FileSystemFinder'],
+)
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(STATIC_SOURCE, 'css'), exist_ok=True)
+        with open(os.path.join(STATIC_SOURCE, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 100)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(STATIC_SOURCE, ignore_errors=True)
+        shutil.rmtree(STATIC_TARGET, ignore_errors=True)
+
+    def hashed_name(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        return staticfiles_storage.stored_name('css/site.css')
+
+    def test_collectstatic_writes_hashed_gzip(self):
+        """collectstatic пишет файл с хешем и .gz рядом."""
+        name = self.hashed_name()
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(
+            os.path.exists(os.path.join(STATIC_TARGET, name + '.gz')))
+
+    def test_serves_precompressed_variant(self):
+        """Сжатый вариант отдается по Accept-Encoding с вечным кешем."""
+        url = '/static/' + self.hashed_name()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_missing_manifest_entry_raises(self):
+        """Файла нет в собранном манифесте - ошибка, а не имя без хеша."""
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        with self.assertRaises(ValueError):
+            staticfiles_storage.stored_name('css/missing.css')
+
+    def test_no_manifest_falls_back_with_warning(self):
+        """Без collectstatic имя остается без хеша, но в логе есть след."""
+        storage = CompressedManifestStorage(location=STATIC_SOURCE)
+        with self.assertLogs('core.staticfiles', 'WARNING'):
+            self.assertEqual(storage.stored_name('css/site.css'),
+                             'css/site.css')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionTests(TestCase):
+    def test_html_is_gzipped(self):
+        """HTML-страница сжимается gzip."""
+        response = self.client.get(reverse('about:author'),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'<html', gzip.decompress(response.content))
+
+    def test_without_accept_encoding(self):
+        """Без Accept-Encoding ответ не сжимается."""
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        """Потоковый ответ сжимается по кускам."""
+        from core.compression import CompressionMiddleware
+
+        def view(request):
+            return StreamingHttpResponse(
+                (b'chunk %d\n' % i for i in range(100)),
+                content_type='text/plain')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompressionMiddleware(view)(request)
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body.count(b'chunk'), 100)
+        self.assertFalse(response.has_header('Content-Length'))
+
+
+class StaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @cache_page_swr(20, stale_timeout=60, key_prefix='test')
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'version {self.calls}')
+        self.view = view
+
+    def expire(self, request):
+        """Делает закешированную копию устаревшей."""
+        key = page_cache_key(request, 'test')
+        response, _ = cache.get(key)
+        cache.set(key, (response, 0), 60)
+        return key
+
+    def test_fresh_copy_is_served(self):
+        """Свежая копия отдается без вызова представления."""
+        request = self.factory.get('/')
+        self.view(request)
+        response = self.view(request)
+        self.assertEqual(response.content, b'version 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_any_of_several_prefixes_invalidates(self):
+        """Страница с несколькими префиксами сбрасывается любым из них."""
+        request = self.factory.get('/')
+        key = page_cache_key(request, ('test', 'other'))
+        self.assertEqual(page_cache_key(request, ('test', 'other')), key)
+        invalidate_pages('other')
+        changed = page_cache_key(request, ('test', 'other'))
+        self.assertNotEqual(changed, key)
+        invalidate_pages('test')
+        self.assertNotEqual(page_cache_key(request, ('test', 'other')),
+                            changed)
+
+    def test_stale_copy_served_while_locked(self):
+        """Пока страницу пересобирают, остальным отдается старая копия."""
+        request = self.factory.get('/')
+        self.view(request)
+        key = self.expire(request)
+        cache.add(key + '.lock', 1, 30)
+        response = self.view(request)
+        self.assertEqual(response.content, b'version 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_copy_is_rebuilt(self):
+        """Первый запрос после устаревания пересобирает страницу."""
+        request = self.factory.get('/')
+        self.view(request)
+        key = self.expire(request)
+        response = self.view(request)
+        self.assertEqual(response.content, b'version 2')
+        self.assertIsNone(cache.get(key + '.lock'))
+        self.assertEqual(self.view(request).content, b'version 2')
+
+    def test_logged_in_copy_is_not_shared(self):
+        """Копия страницы вошедшего не отдается другим."""
+        request = self.factory.get('/')
+        request.user = get_user_model()(pk=1, username='first')
+        self.view(request)
+        anonymous = self.factory.get('/')
+        self.assertEqual(self.view(anonymous).content, b'version 2')
+        self.assertEqual(self.view(request).content, b'version 1')
+
+
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.sqlite3')
+        self.cache = self.make_process()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_process(self):
+        """Бэкенд с собственным L1, как в отдельном процессе."""
+        backend = TwoTierCache(
+            self.path, {'OPTIONS': {'L1_CHECK_INTERVAL': 0}})
+        backend.local = LocalLRU(max_entries=2)
+        return backend
+
+    def test_values_are_shared_between_processes(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.make_process().get('key'), {'a': 1})
+
+    def test_delete_reaches_other_l1(self):
+        """Удаление сбрасывает копию в L1 другого процесса."""
+        other = self.make_process()
+        self.cache.set('key', 'old')
+        self.assertEqual(other.get('key'), 'old')
+        self.cache.delete('key')
+        self.assertIsNone(other.get('key'))
+
+    def test_own_writes_keep_l1(self):
+        """Собственные записи не сбрасывают L1 процесса."""
+        self.cache.set('first', 1)
+        self.cache.get('first')
+        self.cache.set('second', 2)
+        self.assertIn(
+            self.cache.make_key('first'), self.cache.local.entries)
+
+    def test_new_keys_keep_other_l1(self):
+        """Запись нового ключа не сбрасывает L1 других процессов."""
+        other = self.make_process()
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        self.cache.set('fresh', 1)
+        other._sync()
+        self.assertIn(self.cache.make_key('key'), other.local.entries)
+
+    def test_overwrite_reaches_other_l1(self):
+        """Перезапись живого ключа видна процессу с копией в L1."""
+        other = self.make_process()
+        self.cache.set('key', 'old')
+        self.assertEqual(other.get('key'), 'old')
+        self.cache.set('key', 'new')
+        self.assertEqual(other.get('key'), 'new')
+
+    def test_overwrite_keeps_other_keys_in_l1(self):
+        """Перезапись одного ключа не сбрасывает остальные копии в L1."""
+        other = self.make_process()
+        self.cache.set('key', 'old')
+        self.cache.set('kept', 'value')
+        other.get('key')
+        other.get('kept')
+        self.cache.set('key', 'new')
+        self.assertEqual(other.get('key'), 'new')
+        self.assertIn(self.cache.make_key('kept'), other.local.entries)
+
+    def test_trimmed_log_flushes_l1(self):
+        """Процесс, отставший дальше журнала, сбрасывает L1 целиком."""
+        other = self.make_process()
+        self.cache.set('kept', 'value')
+        other.get('kept')
+        self.cache.set('key', 'old')
+        self.cache.set('key', 'new')
+        self.cache.connection.execute('DELETE FROM cache_change')
+        other._sync()
+        self.assertEqual(other.local.entries, {})
+
+    def test_l1_is_bounded(self):
+        """L1 вытесняет давно не использованные ключи."""
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(len(self.cache.local.entries), 2)
+        self.assertEqual(self.cache.get('a'), 'a')
+
+    def test_add_and_incr(self):
+        """add не перезаписывает живой ключ, incr атомарен."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.make_process().add('counter', 5))
+        self.assertEqual(self.make_process().incr('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_values_are_not_served(self):
+        """Просроченное значение не отдается и перезаписывается add."""
+        self.cache.set('key', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+
+class WindowedPaginatorTests(TestCase):
+    def test_window_has_constant_size(self):
+        """Ссылок на страницы одинаково мало при любом числе страниц."""
+        paginator = WindowedPaginator(range(10000), 10)
+        self.assertEqual(paginator.page_window(500),
+                         [1, ELLIPSIS, 498, 499, 500, 501, 502,
+                          ELLIPSIS, 1000])
+        self.assertEqual(paginator.page_window(1),
+                         [1, 2, 3, ELLIPSIS, 1000])
+        self.assertEqual(WindowedPaginator(range(50), 10).page_window(3),
+                         [1, 2, 3, 4, 5])
+
+    @override_settings(PAGINATOR_MAX_COUNT=15)
+    def test_count_is_capped(self):
+        """Записи считаются только до предела."""
+        user = get_user_model().objects.create(username='author')
+        for i in range(20):
+            user.post_set.create(text=f'Пост {i}')
+        paginator = WindowedPaginator(user.post_set.all(), 10)
+        self.assertEqual(paginator.count, 15)
+        self.assertTrue(paginator.truncated)
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(paginator.get_page(2).window, [1, 2])
+        cache.clear()
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertContains(response, 'Более старые ищите')
+        self.assertFalse(WindowedPaginator(range(15), 10).truncated)
+
+
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_caches_values_but_not_misses(self):
+        """Найденный объект берется из кеша, отсутствие - нет."""
+        lookups = LookupCache('test', maxsize=10, ttl=60)
+        user = get_user_model()(pk=1, username='first')
+        loads = []
+
+        def loader(value):
+            loads.append(1)
+            return value
+        lookups.get('missing', lambda: loader(None))
+        lookups.get('missing', lambda: loader(None))
+        self.assertEqual(len(loads), 2)
+        lookups.get('first', lambda: loader(user))
+        lookups.get('first', lambda: loader(user))
+        self.assertEqual(len(loads), 3)
+
+    def test_invalidation_reaches_other_processes(self):
+        """Сброс в одном процессе виден кешу другого процесса."""
+        first = LookupCache('test', maxsize=10, ttl=60)
+        second = LookupCache('test', maxsize=10, ttl=60)
+        old = get_user_model()(pk=1, username='old')
+        new = get_user_model()(pk=1, username='new')
+        second.get('user', lambda: old)
+        first.invalidate('user', pk=1)
+        self.assertIs(second.get('user', lambda: new), new)
+
+    def test_bounded_and_invalidated_by_pk(self):
+        """Кеш ограничен, запись сбрасывается по pk объекта."""
+        user = get_user_model()(pk=1, username='first')
+        lookups = LookupCache('test', maxsize=1, ttl=60)
+        lookups.get('first', lambda: user)
+        lookups.invalidate('renamed', pk=1)
+        self.assertEqual(lookups.entries, {})
+        lookups.get('a', lambda: user)
+        lookups.get('b', lambda: user)
+        self.assertEqual(list(lookups.entries), ['b'])
@@ -1,6 +1,20 @@
+import hashlib
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+ROW_ESTIMATE_SQL = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+    'mysql': ('SELECT table_rows FROM information_schema.tables '
+              'WHERE table_schema = DATABASE() AND table_name = %s'),
+    # Заполняется командой ANALYZE.
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+}
 
 
 def year(request):
@@ -10,8 +24,144 @@ def year(request):
     }
 
 
+ELLIPSIS = '…'
+
+
+class WindowedPaginator(Paginator):
+    """Paginator, которому не нужен полный COUNT(*) и список всех страниц.
+
+    Записи считаются не дальше PAGINATOR_MAX_COUNT, поэтому и подсчет,
+    и число ссылок в шаблоне не растут вместе с таблицей. Страницы
+    дальше предела недоступны, о чем шаблон пишет на последней
+    странице (truncated): старые записи есть в профилях авторов.
+    """
+    on_each_side = 2
+    on_ends = 1
+    ellipsis = ELLIPSIS
+
+    @cached_property
+    def counted(self):
+        """Число записей, но не больше PAGINATOR_MAX_COUNT + 1."""
+        limit = settings.PAGINATOR_MAX_COUNT + 1
+        if isinstance(self.object_list, QuerySet):
+            return self.object_list[:limit].count()
+        if hasattr(self.object_list, 'capped_count'):
+            return self.object_list.capped_count(limit)
+        return len(self.object_list)
+
+    @cached_property
+    def count(self):
+        return min(self.counted, settings.PAGINATOR_MAX_COUNT)
+
+    @cached_property
+    def truncated(self):
+        return self.counted > settings.PAGINATOR_MAX_COUNT
+
+    def _get_page(self, *args, **kwargs):
+        # Страница остается обычной Page: к ней добавляется только
+        # окно номеров для шаблона.
+        page = super()._get_page(*args, **kwargs)
+        page.window = self.page_window(page.number)
+        return page
+
+    def page_window(self, number):
+        """Номера страниц вокруг number, пропуски - ELLIPSIS."""
+        edge = self.on_each_side + self.on_ends + 1
+        if self.num_pages <= 2 * edge + 1:
+            return list(self.page_range)
+        window = []
+        if number > edge + 1:
+            window += list(range(1, self.on_ends + 1)) + [ELLIPSIS]
+            start = number - self.on_each_side
+        else:
+            start = 1
+        if number < self.num_pages - edge:
+            stop = number + self.on_each_side
+            tail = [ELLIPSIS] + list(range(
+                self.num_pages - self.on_ends + 1, self.num_pages + 1))
+        else:
+            stop = self.num_pages
+            tail = []
+        return window + list(range(start, stop + 1)) + tail
+
+
 def paginator(request, posts):
-    paginator = Paginator(posts, settings.PAGE_SIZE)
+    paginator = WindowedPaginator(posts, settings.PAGE_SIZE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+class KeysetPage:
+    """Страница, которая продолжается с ключа ?after=<pk>, без OFFSET."""
+    def __init__(self, object_list, next_after):
+        self.object_list = object_list
+        self.next_after = next_after
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_paginator(request, queryset):
+    after = request.GET.get('after', '')
+    if after.isdigit():
+        queryset = queryset.filter(pk__lt=after)
+    items = list(queryset.order_by('-pk')[:settings.PAGE_SIZE + 1])
+    next_after = None
+    if len(items) > settings.PAGE_SIZE:
+        items = items[:settings.PAGE_SIZE]
+        next_after = items[-1].pk
+    return KeysetPage(items, next_after)
+
+
+def table_row_estimate(model, using):
+    """Число строк таблицы по статистике планировщика или None."""
+    connection = connections[using]
+    sql = ROW_ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    # В sqlite_stat1 первое число строки stat - количество строк.
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц без точного COUNT(*) на каждый запрос.
+
+    Для таблицы без фильтров берется оценка планировщика, если она
+    больше ADMIN_COUNT_ESTIMATE_THRESHOLD. Остальные счетчики считаются
+    точно; с count_key (например, фильтры из адреса changelist)
+    результат кешируется на ADMIN_COUNT_CACHE_SECONDS.
+    """
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, count_key=None):
+        super().__init__(object_list, per_page, orphans,
+                         allow_empty_first_page)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return len(queryset)
+        if not queryset.query.where:
+            estimate = table_row_estimate(queryset.model, queryset.db)
+            if (estimate is not None
+                    and estimate >= settings.ADMIN_COUNT_ESTIMATE_THRESHOLD):
+                return estimate
+        if self.count_key is None:
+            return queryset.count()
+        key = 'count.' + hashlib.md5(
+            self.count_key.encode('utf-8')).hexdigest()
+        return cache.get_or_set(
+            key, queryset.count, settings.ADMIN_COUNT_CACHE_SECONDS)
@@ -1,9 +1,84 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
 
+from core.utils import EstimatedCountPaginator
+
+from . import bulk
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class GroupListFilter(admin.SimpleListFilter):
+    """Фильтр по группе со списком групп из кеша."""
+    title = 'группа'
+    parameter_name = 'group'
+
+    def lookups(self, request, model_admin):
+        return Group.cached_choices()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(group_id=self.value())
+        return queryset
+
+
+class CachedGroupChoices:
+    """Варианты выбора группы, читаются из кеша при выводе виджета."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        yield '', self.field.empty_label
+        yield from Group.cached_choices()
+
+
+class CachedGroupChoiceField(forms.ModelChoiceField):
+    """Выбор группы со списком из Group.cached_choices().
+
+    Обычный ModelChoiceField запрашивает группы для каждой строки
+    changelist; здесь база нужна только при сохранении.
+    """
+    def _get_choices(self):
+        return CachedGroupChoices(self)
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+
+class PostChangeListForm(forms.ModelForm):
+    group = CachedGroupChoiceField(
+        Group.objects.all(), required=False, label='группа')
+
+
+class PostActionForm(ActionForm):
+    group = forms.TypedChoiceField(
+        label='группа', required=False, coerce=int, empty_value=None)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['group'].choices = (
+            [('', 'без группы')] + Group.cached_choices())
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist без точного COUNT(*) и без select на каждый FK."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        # Число строк зависит только от фильтров и поиска в адресе.
+        params = sorted((name, value)
+                        for name, values in request.GET.lists()
+                        for value in values
+                        if name not in (PAGE_VAR, ORDER_VAR))
+        count_key = f'{self.model._meta.label}:{params}'
+        return self.paginator(queryset, per_page, orphans,
+                              allow_empty_first_page, count_key=count_key)
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,12 +87,69 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', GroupListFilter)
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('reassign_group', 'delete_spam')
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', PostChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def reassign_group(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            self.message_user(request, 'Выберите группу из списка.',
+                              messages.ERROR)
+            return
+        updated = bulk.reassign_group(queryset, form.cleaned_data['group'])
+        self.message_user(request, f'Перенесено постов: {updated}.')
+    reassign_group.short_description = 'Перенести в выбранную группу'
+    reassign_group.allowed_permissions = ('change',)
+
+    def delete_spam(self, request, queryset):
+        deleted = bulk.delete_posts(queryset)
+        self.message_user(request, f'Удалено постов: {deleted}.')
+    delete_spam.short_description = 'Удалить как спам'
+    delete_spam.allowed_permissions = ('delete',)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+    search_fields = ('text',)
+    list_filter = ('created',)
+    actions = ('purge_authors',)
+
+    def purge_authors(self, request, queryset):
+        authors = list(queryset.order_by()
+                       .values_list('author', flat=True).distinct())
+        deleted = bulk.purge_comments(authors)
+        self.message_user(request, f'Удалено комментариев: {deleted}.')
+    purge_authors.short_description = (
+        'Удалить все комментарии авторов выбранных')
+    purge_authors.allowed_permissions = ('delete',)
+
+
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
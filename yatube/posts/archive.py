@@ -0,0 +1,96 @@
+from django.db import transaction
+
+from core.models import MediaBlob
+
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+
+
+def archive_posts(cutoff, batch_size=500):
+    """Переносит посты старше cutoff вместе с комментариями в архив.
+
+    Работает пачками, каждая пачка - отдельная транзакция, поэтому
+    база не блокируется надолго, а прерванный перенос можно продолжить.
+    Архивная копия сохраняет id поста. Новые посты его не получат:
+    Django объявляет первичный ключ в SQLite как AUTOINCREMENT, а
+    последовательности других баз не откатываются.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pub_date__lt=cutoff)
+                .order_by('pk')[:batch_size]
+            )
+            if not posts:
+                return moved
+            ids = [post.pk for post in posts]
+            ArchivedPost.objects.bulk_create([
+                ArchivedPost(
+                    id=post.pk,
+                    text=post.text,
+                    pub_date=post.pub_date,
+                    author_id=post.author_id,
+                    group_id=post.group_id,
+                    image=post.image.name,
+                ) for post in posts
+            ])
+            ArchivedComment.objects.bulk_create([
+                ArchivedComment(
+                    id=comment.pk,
+                    post_id=comment.post_id,
+                    text=comment.text,
+                    author_id=comment.author_id,
+                    created=comment.created,
+                ) for comment in Comment.objects.filter(post_id__in=ids)
+            ])
+            for post in posts:
+                # Ссылка переходит к архивной копии до удаления поста.
+                MediaBlob.acquire(post.image.name)
+            Post.objects.filter(pk__in=ids).delete()
+        moved += len(posts)
+
+
+def author_post_count(author):
+    """Число постов автора с учетом архивных."""
+    return author.post_set.count() + author.archived_posts.count()
+
+
+class ChainedPosts:
+    """Живые посты, а за ними архивные - как один список для пагинатора.
+
+    Архивные посты всегда старше живых, поэтому сортировка по
+    -pub_date сохраняется без слияния. Ни подсчет для пагинатора, ни
+    выборка страницы не считают таблицы целиком.
+    """
+    def __init__(self, live, archived):
+        self.live = live
+        self.archived = archived
+
+    def count(self):
+        return self.live.count() + self.archived.count()
+
+    def capped_count(self, limit):
+        """Число постов, но не больше limit."""
+        live = self.live[:limit].count()
+        if live >= limit:
+            return live
+        return live + self.archived[:limit - live].count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        result = list(self.live[start:stop])
+        if len(result) == stop - start:
+            return result
+        # Живые посты кончились внутри среза или до него.
+        live_count = (start + len(result) if result
+                      else self.live[:start].count())
+        result.extend(
+            self.archived[max(start - live_count, 0):stop - live_count])
+        return result
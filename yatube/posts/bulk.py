@@ -0,0 +1,121 @@
+"""Массовые операции модерации одним запросом к базе.
+
+Сигналы отдельных объектов не вызываются: все, что они делали бы
+для каждой строки, выполняется один раз на всю выборку.
+"""
+from django.db import models, transaction
+
+from core.models import MediaBlob
+from core.page_cache import invalidate_pages
+
+from . import lookups, pages
+from .models import Comment, GroupStats, Post
+
+
+def affected_by(posts):
+    """Группы, авторы и pk постов выборки - чьи страницы сбросить."""
+    rows = list(posts.order_by().values_list('pk', 'group', 'author'))
+    return {
+        'post_ids': [pk for pk, _, _ in rows],
+        'group_ids': {group_id for _, group_id, _ in rows},
+        'user_ids': {author_id for _, _, author_id in rows},
+    }
+
+
+def posts_changed(**affected):
+    invalidate_pages(pages.INDEX_PAGE)
+    pages.invalidate(**affected)
+    pages.invalidate_feeds_on_commit(affected.get('user_ids', ()))
+
+
+def reassign_group(queryset, group_id):
+    """Переносит посты выборки в группу group_id (None - без группы)."""
+    with transaction.atomic():
+        affected = affected_by(queryset)
+        updated = queryset.order_by().update(group_id=group_id)
+        affected['group_ids'].add(group_id)
+        GroupStats.recount(affected['group_ids'])
+    if updated:
+        # Одна смена поколения вместо сброса каждого поста.
+        lookups.posts.invalidate()
+        posts_changed(**affected)
+    return updated
+
+
+# Ссылки на Post, которые delete_dependents обрабатывает сам.
+RAW_ON_DELETE = (models.CASCADE, models.SET_NULL, models.DO_NOTHING,
+                 models.PROTECT)
+
+
+def raw_delete(queryset):
+    """Один DELETE без Collector, если на модель никто не ссылается."""
+    if queryset.model._meta.related_objects:
+        deleted, _ = queryset.delete()
+        return deleted
+    return queryset._raw_delete(queryset.db)
+
+
+def can_delete_raw():
+    return all(relation.many_to_many or relation.on_delete in RAW_ON_DELETE
+               for relation in Post._meta.related_objects)
+
+
+def delete_dependents(posts):
+    """Удаляет или отвязывает строки, ссылающиеся на посты выборки.
+
+    Ссылки берутся из Post._meta.related_objects, поэтому новая модель
+    с внешним ключом на Post не требует правки здесь. Сигналы зависимых
+    строк не вызываются: страницы постов сбрасывает вызывающий.
+    """
+    for relation in Post._meta.related_objects:
+        if relation.many_to_many:
+            through = relation.through
+            name = relation.field.m2m_reverse_field_name()
+            raw_delete(
+                through._base_manager.filter(**{f'{name}__in': posts}))
+            continue
+        name = relation.field.name
+        related = relation.related_model._base_manager.filter(
+            **{f'{name}__in': posts})
+        if relation.on_delete is models.CASCADE:
+            raw_delete(related)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{name: None})
+        elif relation.on_delete is models.PROTECT and related.exists():
+            raise models.ProtectedError(
+                f'На посты ссылается {relation.related_model.__name__}',
+                related)
+
+
+def delete_posts(queryset):
+    """Удаляет посты выборки вместе с комментариями."""
+    posts = Post.objects.filter(pk__in=queryset.order_by().values('pk'))
+    with transaction.atomic():
+        images = list(posts.exclude(image='')
+                      .values_list('image', flat=True))
+        affected = affected_by(posts)
+        if can_delete_raw():
+            delete_dependents(posts)
+            # Обычный delete() загрузил бы каждый пост ради post_delete;
+            # освобождение картинок ниже делается за всю выборку сразу.
+            deleted = posts._raw_delete(posts.db)
+            MediaBlob.release_many(images)
+            GroupStats.recount(affected['group_ids'])
+        else:
+            # Ссылку с другим on_delete разберет только Collector;
+            # картинки и статистику групп тогда ведут сигналы постов.
+            _, deleted_by_model = posts.delete()
+            deleted = deleted_by_model.get(Post._meta.label, 0)
+    if deleted:
+        posts_changed(**affected)
+    return deleted
+
+
+def purge_comments(authors):
+    """Удаляет все комментарии авторов из выборки authors."""
+    comments = Comment.objects.filter(author__in=authors)
+    post_ids = set(comments.order_by().values_list('post', flat=True)
+                   .distinct())
+    deleted = raw_delete(comments)
+    pages.invalidate(post_ids=post_ids)
+    return deleted
@@ -0,0 +1,47 @@
+"""Кешированный поиск группы, автора и владельца поста для views."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404
+
+from core.lookup_cache import LookupCache
+
+from .models import ArchivedPost, Group, Post
+
+User = get_user_model()
+
+groups = LookupCache('groups', settings.LOOKUP_CACHE_SIZE,
+                     settings.LOOKUP_CACHE_TTL)
+authors = LookupCache('authors', settings.LOOKUP_CACHE_SIZE,
+                      settings.LOOKUP_CACHE_TTL)
+posts = LookupCache('posts', settings.LOOKUP_CACHE_SIZE,
+                    settings.LOOKUP_CACHE_TTL)
+
+
+def get_group_or_404(slug):
+    group = groups.get(
+        slug, lambda: Group.objects.filter(slug=slug).first())
+    if group is None:
+        raise Http404('Группа не найдена')
+    return group
+
+
+def get_author_or_404(username):
+    author = authors.get(
+        username,
+        lambda: User.objects.filter(username=username,
+                                    is_active=True).first())
+    if author is None:
+        raise Http404('Пользователь не найден')
+    return author
+
+
+def get_post_owner(post_id):
+    """Пост или архивный пост только с автором и группой, либо None."""
+    def load():
+        for model in (Post, ArchivedPost):
+            post = (model.objects.filter(pk=post_id)
+                    .only('author', 'group').first())
+            if post is not None:
+                return post
+        return None
+    return posts.get(post_id, load)
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import build_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации "на кого подписаться".'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int,
+                            default=settings.SUGGESTIONS_COUNT)
+
+    def handle(self, *args, **options):
+        total = build_suggestions(options['top'])
+        self.stdout.write(f'Сохранено рекомендаций: {total}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import PostScore
+
+
+class Command(BaseCommand):
+    help = ('Затухание рейтингов ленты популярного. Запускать по cron '
+            'с тем же --hours, что и интервал запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        deleted = PostScore.decay(options['hours'])
+        self.stdout.write(f'Рейтинги обновлены, удалено остывших: {deleted}')
@@ -0,0 +1,81 @@
+import csv
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import pages
+from posts.models import Follow, ProfileStats
+
+User = get_user_model()
+# Не больше параметров в одном запросе, чем позволяет SQLite.
+LOOKUP_CHUNK = 500
+
+
+class Command(BaseCommand):
+    help = ('Массовый импорт подписок из CSV со строками '
+            '"user_id,author_id". Существующие подписки пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        touched, readers = set(), set()
+        total = 0
+        with open(options['path'], newline='') as source:
+            batch = []
+            for row in csv.reader(source):
+                if len(row) != 2 or not (row[0].isdigit()
+                                         and row[1].isdigit()):
+                    # Заголовок или мусорная строка.
+                    continue
+                user_id, author_id = int(row[0]), int(row[1])
+                if user_id != author_id:
+                    batch.append((user_id, author_id))
+                if len(batch) >= options['batch_size']:
+                    total += self.import_batch(batch, touched, readers)
+                    batch = []
+            total += self.import_batch(batch, touched, readers)
+        ProfileStats.recount(touched)
+        self.invalidate_pages(touched, readers)
+        self.stdout.write(
+            f'Обработано подписок: {total}, '
+            f'пересчитано профилей: {len(touched)}')
+
+    def invalidate_pages(self, touched, readers):
+        """Сбрасывает профили обеих сторон и ленты подписавшихся.
+
+        bulk_create не отправляет сигналов, поэтому без этого счетчики
+        и ленты отдавались бы из кеша старыми.
+        """
+        touched, readers = list(touched), list(readers)
+        step = settings.INVALIDATION_BATCH_SIZE
+        for start in range(0, len(touched), step):
+            pages.invalidate(user_ids=touched[start:start + step])
+        for start in range(0, len(readers), step):
+            pages.invalidate(feed_ids=readers[start:start + step])
+
+    def import_batch(self, batch, touched, readers):
+        if not batch:
+            return 0
+        ids = list({user_id for edge in batch for user_id in edge})
+        existing = set()
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            existing.update(
+                User.objects.filter(pk__in=ids[start:start + LOOKUP_CHUNK])
+                .values_list('pk', flat=True))
+        follows = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in batch
+            if user_id in existing and author_id in existing
+        ]
+        with transaction.atomic():
+            Follow.objects.bulk_create(follows, ignore_conflicts=True,
+                                       batch_size=LOOKUP_CHUNK)
+        for follow in follows:
+            touched.add(follow.user_id)
+            touched.add(follow.author_id)
+            readers.add(follow.user_id)
+        return len(follows)
@@ -0,0 +1,110 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.models import MediaBlob
+from core.storage import content_storage
+from posts.models import ArchivedPost, Post
+
+
+# Не больше параметров в одном запросе, чем позволяет SQLite.
+LOOKUP_CHUNK = 500
+
+
+def walk_files(root, relative=''):
+    """Файлы под root с временем изменения.
+
+    Записи каталога читаются os.scandir по одной, так что в памяти
+    держится только текущая ветка обхода, а не все дерево.
+    """
+    try:
+        entries = os.scandir(os.path.join(root, relative))
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            name = f'{relative}/{entry.name}' if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(root, name)
+            else:
+                yield name, entry.stat().st_mtime
+
+
+def referenced_images(names):
+    """Те из names, на которые ссылаются посты или архив.
+
+    Сравнение точное, через IN, поэтому не зависит от того, в каком
+    порядке база сортирует строки.
+    """
+    referenced = set()
+    for model in (Post, ArchivedPost):
+        referenced.update(model.objects.filter(image__in=names)
+                          .values_list('image', flat=True))
+    return referenced
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые нет ссылок в базе, '
+            'вместе с их миниатюрами, и осиротевшие миниатюры.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не трогать файлы моложе этого срока - '
+                 'их пост мог еще не сохраниться.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.deadline = time.time() - options['grace_hours'] * 60 * 60
+        images = self.collect_images()
+        thumbnails = self.collect_thumbnails()
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(
+            f'{verb}: картинок {images}, миниатюр {thumbnails}')
+
+    def collect_images(self):
+        upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+        deleted = 0
+        candidates = []
+        for name, mtime in walk_files(settings.MEDIA_ROOT, upload_to):
+            if mtime > self.deadline:
+                continue
+            candidates.append(name)
+            if len(candidates) >= LOOKUP_CHUNK:
+                deleted += self.delete_orphans(candidates)
+                candidates = []
+        return deleted + self.delete_orphans(candidates)
+
+    def delete_orphans(self, names):
+        if not names:
+            return 0
+        orphans = set(names) - referenced_images(names)
+        for name in sorted(orphans):
+            self.stdout.write(name, self.style.WARNING)
+            if not self.dry_run:
+                delete_with_thumbnails(ImageFile(name, content_storage))
+                MediaBlob.objects.filter(name=name).delete()
+        return len(orphans)
+
+    def collect_thumbnails(self):
+        """Миниатюры, о которых не знает key-value хранилище sorl."""
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        deleted = 0
+        for name, mtime in walk_files(settings.MEDIA_ROOT, prefix):
+            if mtime > self.deadline:
+                continue
+            thumbnail = ImageFile(name, default.storage)
+            if default.kvstore.get(thumbnail) is not None:
+                continue
+            deleted += 1
+            self.stdout.write(name, self.style.WARNING)
+            if not self.dry_run:
+                thumbnail.delete()
+        return deleted
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import MediaBlob
+from core.storage import content_storage
+from posts.models import ArchivedPost, Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов из плоского каталога posts/ '
+            'в хранилище по хешу содержимого.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (Post, ArchivedPost):
+            moved = self.migrate_model(model, options['batch_size'])
+            self.stdout.write(f'{model.__name__}: перенесено {moved}')
+
+    def migrate_model(self, model, batch_size):
+        moved = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk).exclude(image='')
+                .order_by('pk').values_list('pk', 'image')[:batch_size]
+            )
+            if not rows:
+                return moved
+            last_pk = rows[-1][0]
+            for pk, old_name in rows:
+                if (content_storage.is_content_name(old_name)
+                        or not content_storage.exists(old_name)):
+                    continue
+                with content_storage.open(old_name) as source:
+                    new_name = content_storage.save(old_name, source)
+                with transaction.atomic():
+                    model.objects.filter(pk=pk).update(image=new_name)
+                    MediaBlob.acquire(new_name)
+                    transaction.on_commit(
+                        lambda name=old_name: content_storage.delete(name))
+                moved += 1
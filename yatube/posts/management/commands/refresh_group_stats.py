@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Group, GroupStats
+
+
+class Command(BaseCommand):
+    help = ('Сдвигает окно "постов за сутки" в статистике групп. '
+            'Запускать раз в час; --recount пересчитывает все с нуля.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            GroupStats.recount(Group.objects.values_list('pk', flat=True))
+        else:
+            GroupStats.roll_all()
+        self.stdout.write('Статистика групп обновлена')
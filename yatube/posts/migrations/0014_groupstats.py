@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:29
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    now = timezone.now()
+    current_hour = int(now.timestamp()) // 3600
+    stats = {}
+    rows = (Post.objects.filter(group__isnull=False).values('group')
+            .annotate(total=models.Count('pk'), last=models.Max('pub_date'))
+            .order_by())
+    for row in rows:
+        stats[row['group']] = GroupStats(
+            group_id=row['group'], posts_count=row['total'],
+            last_post=row['last'], current_hour=current_hour)
+    slots = {group_id: [0] * 24 for group_id in stats}
+    recent = Post.objects.filter(group__isnull=False,
+                                 pub_date__gt=now - timedelta(hours=24))
+    for group_id, pub_date in recent.values_list('group', 'pub_date'):
+        index = current_hour - int(pub_date.timestamp()) // 3600
+        if 0 <= index < 24:
+            slots[group_id][index] += 1
+    for group_id, group_stats in stats.items():
+        group_stats.hourly = ','.join(map(str, slots[group_id]))
+        group_stats.posts_last_day = sum(slots[group_id])
+    GroupStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('last_post', models.DateTimeField(blank=True, null=True, verbose_name='Последний пост')),
+                ('posts_last_day', models.PositiveIntegerField(default=0, verbose_name='Постов за сутки')),
+                ('hourly', models.CharField(blank=True, default='', max_length=200)),
+                ('current_hour', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Статистика группы',
+                'verbose_name_plural': 'Статистика групп',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.cache import cache
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from core.storage import content_storage
 
 User = get_user_model()
 
@@ -10,9 +16,22 @@ class Group(models.Model):
     slug = models.SlugField(max_length=50, unique=True, verbose_name='slug')
     description = models.TextField(verbose_name='описание')
 
+    CHOICES_CACHE_KEY = 'group_choices'
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def cached_choices(cls):
+        """Пары (pk, название) всех групп для списков выбора."""
+        choices = cache.get(cls.CHOICES_CACHE_KEY)
+        if choices is None:
+            choices = list(cls.objects.order_by('title')
+                           .values_list('pk', 'title'))
+            cache.set(cls.CHOICES_CACHE_KEY, choices,
+                      settings.ADMIN_CHOICES_CACHE_SECONDS)
+        return choices
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -41,6 +60,7 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=content_storage,
         blank=True
     )
 
@@ -52,6 +72,14 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:settings.COUNT_TEXT]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Картинка из базы: при сохранении видно, что ее заменили.
+        instance.loaded_image = instance.__dict__.get('image', '')
+        instance.loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -79,6 +107,33 @@ class Comment(models.Model):
         ordering = ['-created']
 
 
+class FollowManager(models.Manager):
+    def follow(self, user_id, author_id):
+        """Подписка одним INSERT без гонки с unique_follow.
+
+        Повторная подписка молча игнорируется базой. Сигналы при этом
+        не отправляются, поэтому счетчики обновляются здесь же.
+        Возвращает True, если подписка создана.
+        """
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        ops = connection.ops
+        sql = '{} {} ({}, {}) VALUES (%s, %s) {}'.format(
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(self.model._meta.db_table),
+            ops.quote_name('user_id'),
+            ops.quote_name('author_id'),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        )
+        with transaction.atomic(using=db):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user_id, author_id])
+                created = cursor.rowcount == 1
+            if created:
+                ProfileStats.follow_changed(user_id, author_id, 1)
+        return created
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         get_user_model(),
@@ -91,8 +146,348 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    objects = FollowManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow')
         ]
+
+
+class ProfileStats(models.Model):
+    """Счетчики подписок пользователя, обновляются при подписке/отписке."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика профиля'
+        verbose_name_plural = 'Статистика профилей'
+
+    @classmethod
+    def bump(cls, user_id, field, delta):
+        updated = cls.objects.filter(user_id=user_id).update(
+            **{field: models.F(field) + delta})
+        if not updated and delta > 0:
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(
+                **{field: models.F(field) + delta})
+
+    @classmethod
+    def recount(cls, user_ids, batch_size=500):
+        """Пересчитывает счетчики пользователей по таблице Follow."""
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            counters = {user_id: cls(user_id=user_id) for user_id in chunk}
+            for field, counter in (('author', 'followers_count'),
+                                   ('user', 'following_count')):
+                rows = (Follow.objects.filter(**{f'{field}__in': chunk})
+                        .values(field).annotate(total=models.Count('pk'))
+                        .order_by())
+                for row in rows:
+                    setattr(counters[row[field]], counter, row['total'])
+            with transaction.atomic():
+                cls.objects.bulk_create(counters.values(),
+                                        ignore_conflicts=True)
+                cls.objects.bulk_update(
+                    counters.values(),
+                    ['followers_count', 'following_count'])
+
+    @classmethod
+    def follow_changed(cls, user_id, author_id, delta):
+        """Учитывает подписку (delta=1) или отписку (delta=-1)."""
+        cls.bump(user_id, 'following_count', delta)
+        cls.bump(author_id, 'followers_count', delta)
+
+
+HOURS_IN_DAY = 24
+
+
+def hour_of(moment):
+    """Номер часа от начала эпохи."""
+    return int(moment.timestamp()) // 3600
+
+
+class GroupStats(models.Model):
+    """Активность группы для каталога, обновляется при изменении постов.
+
+    Посты за сутки считаются по часовым ячейкам: в hourly через запятую
+    записано число постов за час current_hour, current_hour - 1 и т.д.
+    """
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    last_post = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последний пост'
+    )
+    posts_last_day = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов за сутки'
+    )
+    hourly = models.CharField(max_length=200, blank=True, default='')
+    current_hour = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Статистика группы'
+        verbose_name_plural = 'Статистика групп'
+
+    def slots(self):
+        values = [int(value) for value in self.hourly.split(',') if value]
+        return values + [0] * (HOURS_IN_DAY - len(values))
+
+    def set_slots(self, slots):
+        self.hourly = ','.join(map(str, slots))
+        self.posts_last_day = sum(slots)
+
+    def roll(self, hour):
+        """Сдвигает окно суток к часу hour, выбрасывая старые ячейки."""
+        shift = hour - self.current_hour
+        if shift <= 0:
+            return
+        slots = [0] * min(shift, HOURS_IN_DAY) + self.slots()
+        self.current_hour = hour
+        self.set_slots(slots[:HOURS_IN_DAY])
+
+    def count_post(self, pub_date, delta):
+        self.roll(hour_of(timezone.now()))
+        self.posts_count = max(self.posts_count + delta, 0)
+        index = self.current_hour - hour_of(pub_date)
+        if 0 <= index < HOURS_IN_DAY:
+            slots = self.slots()
+            slots[index] = max(slots[index] + delta, 0)
+            self.set_slots(slots)
+
+    @classmethod
+    def post_changed(cls, group_id, pub_date, delta):
+        """Учитывает пост группы: delta=1 - добавлен, -1 - убран."""
+        if group_id is None:
+            return
+        with transaction.atomic():
+            if delta > 0:
+                cls.objects.get_or_create(group_id=group_id)
+            stats = (cls.objects.select_for_update()
+                     .filter(group_id=group_id).first())
+            if stats is None:
+                return
+            stats.count_post(pub_date, delta)
+            if delta > 0:
+                stats.last_post = max(stats.last_post or pub_date, pub_date)
+            elif stats.last_post and pub_date >= stats.last_post:
+                stats.last_post = (
+                    Post.objects.filter(group_id=group_id)
+                    .aggregate(last=models.Max('pub_date'))['last'])
+            stats.save()
+
+    @classmethod
+    def recount(cls, group_ids):
+        """Пересчитывает статистику групп по таблице Post."""
+        group_ids = [pk for pk in set(group_ids) if pk is not None]
+        if not group_ids:
+            return
+        now = timezone.now()
+        counters = {
+            group_id: cls(group_id=group_id, current_hour=hour_of(now))
+            for group_id in group_ids
+        }
+        posts = Post.objects.filter(group_id__in=group_ids).order_by()
+        rows = posts.values('group').annotate(
+            total=models.Count('pk'), last=models.Max('pub_date'))
+        for row in rows:
+            counters[row['group']].posts_count = row['total']
+            counters[row['group']].last_post = row['last']
+        slots = {group_id: [0] * HOURS_IN_DAY for group_id in group_ids}
+        recent = posts.filter(
+            pub_date__gt=now - timedelta(hours=HOURS_IN_DAY))
+        for group_id, pub_date in recent.values_list('group', 'pub_date'):
+            index = hour_of(now) - hour_of(pub_date)
+            if 0 <= index < HOURS_IN_DAY:
+                slots[group_id][index] += 1
+        for group_id, stats in counters.items():
+            stats.set_slots(slots[group_id])
+        with transaction.atomic():
+            cls.objects.bulk_create(counters.values(), ignore_conflicts=True)
+            cls.objects.bulk_update(
+                counters.values(),
+                ['posts_count', 'last_post', 'posts_last_day', 'hourly',
+                 'current_hour'])
+
+    @classmethod
+    def roll_all(cls):
+        """Сдвигает окно суток у всех групп с постами за сутки."""
+        hour = hour_of(timezone.now())
+        pks = cls.objects.filter(posts_last_day__gt=0).values_list(
+            'pk', flat=True)
+        for pk in list(pks):
+            with transaction.atomic():
+                stats = cls.objects.select_for_update().get(pk=pk)
+                stats.roll(hour)
+                stats.save()
+
+
+class PostScore(models.Model):
+    """Рейтинг поста в ленте популярного.
+
+    Комментарии и просмотры прибавляют к рейтингу, decay_trending
+    периодически умножает все рейтинги на коэффициент затухания.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending'
+    )
+    score = models.FloatField(default=0, db_index=True)
+
+    class Meta:
+        verbose_name = 'Рейтинг поста'
+        verbose_name_plural = 'Рейтинги постов'
+
+    @classmethod
+    def bump(cls, post_id, weight):
+        updated = cls.objects.filter(post_id=post_id).update(
+            score=models.F('score') + weight)
+        if not updated:
+            _, created = cls.objects.get_or_create(
+                post_id=post_id, defaults={'score': weight})
+            if not created:
+                cls.objects.filter(post_id=post_id).update(
+                    score=models.F('score') + weight)
+
+    @classmethod
+    def record_view(cls, post_id):
+        """Учитывает просмотр; в базу пишется раз в несколько просмотров."""
+        key = f'trending_views.{post_id}'
+        cache.add(key, 0, None)
+        try:
+            views = cache.incr(key)
+        except ValueError:
+            return
+        if views >= settings.TRENDING_VIEWS_PER_WRITE:
+            cache.decr(key, views)
+            # Архивные посты открываются тем же адресом, их не считаем.
+            if Post.objects.filter(pk=post_id).exists():
+                cls.bump(post_id, views * settings.TRENDING_VIEW_WEIGHT)
+
+    @classmethod
+    def decay(cls, hours):
+        """Затухание за hours часов двумя запросами на всю таблицу."""
+        factor = 0.5 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+        cls.objects.update(score=models.F('score') * factor)
+        deleted, _ = cls.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE).delete()
+        return deleted
+
+    @staticmethod
+    def top(limit):
+        """Самые популярные посты: проход по индексу score."""
+        return (Post.objects.filter(trending__isnull=False,
+                                    author__is_active=True)
+                .select_related('author', 'group')
+                .order_by('-trending__score')[:limit])
+
+
+class FollowSuggestion(models.Model):
+    """Кого подписаться: готовый топ для пользователя, строится офлайн."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ('user', '-score')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_suggestion')
+        ]
+
+
+class ArchivedPost(models.Model):
+    """Пост, перенесенный в архив. Первичный ключ совпадает с исходным."""
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст поста')
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        db_index=True
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор'
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        blank=True,
+        null=True,
+        verbose_name='Группа'
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        storage=content_storage,
+        blank=True
+    )
+    archived = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата архивации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self):
+        return self.text[:settings.COUNT_TEXT]
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост'
+    )
+    text = models.TextField(verbose_name='Текст коментария')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор'
+    )
+    created = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-created']
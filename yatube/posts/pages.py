@@ -0,0 +1,151 @@
+"""Префиксы закешированных страниц и их сброс при изменении данных.
+
+Страницы группы, профиля и поста кешируются по pk объекта, поэтому
+изменение одного поста сбрасывает только страницы, где он виден.
+Лента подписок кешируется для каждого читателя отдельно под версиями
+читателя и всех его авторов: подписка и отписка меняют версию читателя,
+новый пост - версию автора, и подписчиков при этом перебирать не нужно.
+Страницы постов зависят еще и от версий автора и группы: они меняются,
+когда меняется то, что видно рядом с каждым постом автора или группы.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from core.page_cache import invalidate_pages
+
+from .models import ArchivedComment, Comment, Post
+
+INDEX_PAGE = 'index_page'
+
+
+def group_page(group_id):
+    return f'group_page.{group_id}'
+
+
+def profile_page(user_id):
+    return f'profile_page.{user_id}'
+
+
+def post_page(post_id):
+    return f'post_page.{post_id}'
+
+
+def feed_page(user_id):
+    return f'feed.{user_id}'
+
+
+def author_page(user_id):
+    return f'author.{user_id}'
+
+
+def author_feed(user_id):
+    return f'author_feed.{user_id}'
+
+
+def feed_prefixes(user_id, author_ids):
+    """Префиксы ленты: читатель и каждый автор, на которого он подписан."""
+    return (feed_page(user_id),
+            *(author_feed(pk) for pk in sorted(author_ids)))
+
+
+def group_info(group_id):
+    return f'group_info.{group_id}'
+
+
+def post_prefixes(post):
+    """Префиксы страницы поста: сам пост, его автор и группа."""
+    prefixes = (post_page(post.pk), author_page(post.author_id))
+    if post.group_id is not None:
+        prefixes += (group_info(post.group_id),)
+    return prefixes
+
+
+def invalidate(group_ids=(), user_ids=(), post_ids=(), feed_ids=(),
+               author_ids=()):
+    """Сбрасывает страницы объектов одним обращением к кешу."""
+    invalidate_pages(
+        *(group_page(pk) for pk in set(group_ids) if pk is not None),
+        *(profile_page(pk) for pk in set(user_ids) if pk is not None),
+        *(post_page(pk) for pk in set(post_ids) if pk is not None),
+        *(feed_page(pk) for pk in set(feed_ids) if pk is not None),
+        *(author_page(pk) for pk in set(author_ids) if pk is not None),
+    )
+
+
+def invalidate_author(user_id):
+    """Сбрасывает все страницы с постами автора.
+
+    Посты не перебираются: страницы постов сбрасывает версия автора,
+    а групп у его постов не больше, чем групп вообще. Посты, которые
+    автор прокомментировал, сбрасываются пачками после коммита.
+    """
+    group_ids = set(Post.objects.filter(author_id=user_id)
+                    .exclude(group=None).order_by()
+                    .values_list('group', flat=True).distinct())
+    invalidate_pages(INDEX_PAGE)
+    invalidate(group_ids=group_ids, user_ids={user_id},
+               author_ids={user_id})
+    invalidate_feeds_on_commit({user_id})
+    transaction.on_commit(lambda: invalidate_commented(user_id))
+
+
+def invalidate_commented(user_id, batch_size=None):
+    """Сбрасывает страницы постов с комментариями пользователя.
+
+    Комментарии читаются пачками по pk, на пачку приходится одна
+    запись в кеш.
+    """
+    batch_size = batch_size or settings.INVALIDATION_BATCH_SIZE
+    for model in (Comment, ArchivedComment):
+        comments = model.objects.filter(author_id=user_id)
+        last_pk = 0
+        while True:
+            rows = list(comments.filter(pk__gt=last_pk).order_by('pk')
+                        .values_list('pk', 'post')[:batch_size])
+            if not rows:
+                break
+            invalidate(post_ids={post_id for _, post_id in rows})
+            last_pk = rows[-1][0]
+
+
+def invalidate_feeds(author_ids):
+    """Сбрасывает ленты всех подписчиков авторов.
+
+    Меняется только версия каждого автора, входящая в ключи лент его
+    подписчиков, так что стоимость не зависит от числа подписчиков.
+    """
+    invalidate_pages(
+        *(author_feed(pk) for pk in set(author_ids) if pk is not None))
+
+
+class FeedFanout:
+    """Авторы, чьи версии лент меняются после коммита."""
+
+    def __init__(self):
+        self.author_ids = set()
+
+    def __call__(self):
+        invalidate_feeds(self.author_ids)
+
+
+_pending = threading.local()
+
+
+def invalidate_feeds_on_commit(author_ids, using=None):
+    """Как invalidate_feeds, но после коммита и один раз на транзакцию.
+
+    Удаление пачки постов одного автора меняет его версию один раз,
+    а не на каждый пост. До коммита версии лент не меняются, иначе
+    параллельный запрос закешировал бы старую ленту под новой версией.
+    """
+    connection = transaction.get_connection(using)
+    fanout = getattr(_pending, 'fanout', None)
+    if fanout is not None and any(
+            func is fanout for _, func in connection.run_on_commit):
+        fanout.author_ids.update(author_ids)
+        return
+    fanout = _pending.fanout = FeedFanout()
+    fanout.author_ids.update(author_ids)
+    transaction.on_commit(fanout, using)
@@ -0,0 +1,159 @@
+import heapq
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Follow, FollowSuggestion
+
+
+class FollowGraph:
+    """Граф подписок в виде CSR-массивов.
+
+    Пользователи пронумерованы подряд по возрастанию id; подписки
+    узла i лежат в out_indices[out_indptr[i]:out_indptr[i + 1]],
+    подписчики - в in_indices[in_indptr[i]:in_indptr[i + 1]].
+    Все данные, включая соответствие id и номеров, хранятся в array.
+    Ребра, концов которых нет среди ids, пропускаются: подписка могла
+    появиться между чтением ids и чтением ребер.
+    """
+    def __init__(self, ids, edges):
+        self.ids = array('q', ids)
+        sources = array('l')
+        targets = array('l')
+        for user_id, author_id in edges:
+            source, target = self.node(user_id), self.node(author_id)
+            if source is None or target is None:
+                continue
+            sources.append(source)
+            targets.append(target)
+        self.out_indptr, self.out_indices = self.build(sources, targets)
+        self.in_indptr, self.in_indices = self.build(targets, sources)
+        # Плотный накопитель очков, общий для всех узлов: после подсчета
+        # обнуляются только тронутые ячейки.
+        self.accumulator = array('d', bytes(8 * len(self.ids)))
+
+    def node(self, user_id):
+        """Номер узла по id пользователя (ids отсортированы) или None."""
+        node = bisect_left(self.ids, user_id)
+        if node < len(self.ids) and self.ids[node] == user_id:
+            return node
+        return None
+
+    def build(self, sources, targets):
+        size = len(self.ids)
+        indptr = array('l', [0]) * (size + 1)
+        for source in sources:
+            indptr[source + 1] += 1
+        for i in range(size):
+            indptr[i + 1] += indptr[i]
+        indices = array('l', [0]) * len(targets)
+        position = array('l', indptr[:-1])
+        for source, target in zip(sources, targets):
+            indices[position[source]] = target
+            position[source] += 1
+        return indptr, indices
+
+    @classmethod
+    def load(cls):
+        users = Follow.objects.values_list('user_id', flat=True)
+        ids = (users.union(Follow.objects.values_list('author_id', flat=True))
+               .order_by('user_id'))
+        # Оба чтения в одной транзакции: там, где она дает снимок,
+        # ids и ребра согласованы, в остальных случаях лишние ребра
+        # отбросит конструктор.
+        with transaction.atomic():
+            return cls(ids.iterator(),
+                       Follow.objects.values_list('user_id', 'author_id')
+                       .iterator(chunk_size=10000))
+
+    def following(self, node):
+        return self.out_indices[self.out_indptr[node]:
+                                self.out_indptr[node + 1]]
+
+    def followers(self, node):
+        return self.in_indices[self.in_indptr[node]:self.in_indptr[node + 1]]
+
+    def scores(self, node):
+        """Подписки подписок и авторы, которых читают со-подписчики.
+
+        Строка произведения разреженных матриц по Густавсону: строки
+        CSR складываются в плотный накопитель. Возвращает пары
+        (узел, очки).
+        """
+        touched = array('l')
+        followed = self.following(node)
+        for friend in followed:
+            self.accumulate(self.following(friend), 1.0, touched)
+        for author in followed:
+            # Популярные авторы дают слишком много со-подписчиков,
+            # поэтому берем только часть из них.
+            co_followers = self.followers(author)[
+                :settings.SUGGESTIONS_MAX_CO_FOLLOWERS]
+            for co_follower in co_followers:
+                if co_follower != node:
+                    self.accumulate(self.following(co_follower),
+                                    settings.SUGGESTIONS_CO_WEIGHT, touched)
+        self.accumulator[node] = 0
+        for author in followed:
+            self.accumulator[author] = 0
+        return self.collect(touched)
+
+    def accumulate(self, candidates, weight, touched):
+        accumulator = self.accumulator
+        for candidate in candidates:
+            if not accumulator[candidate]:
+                touched.append(candidate)
+            accumulator[candidate] += weight
+
+    def collect(self, touched):
+        """Забирает ненулевые очки и обнуляет накопитель."""
+        accumulator = self.accumulator
+        result = []
+        for candidate in touched:
+            if accumulator[candidate]:
+                result.append((candidate, accumulator[candidate]))
+                accumulator[candidate] = 0
+        return result
+
+
+def build_suggestions(top_n=None, batch_size=1000):
+    """Пересчитывает рекомендации для всех пользователей.
+
+    Рекомендации пишутся пачками по batch_size пользователей, каждая
+    пачка заменяется в своей транзакции, так что в памяти держится
+    только одна пачка строк. Пачка очищает диапазон id от конца
+    предыдущей пачки до своего конца, поэтому старые рекомендации
+    пользователей, выпавших из графа, тоже удаляются.
+    """
+    top_n = top_n or settings.SUGGESTIONS_COUNT
+    graph = FollowGraph.load()
+    total = 0
+    previous_end = None
+    for start in range(0, len(graph.ids), batch_size):
+        nodes = range(start, min(start + batch_size, len(graph.ids)))
+        rows = []
+        for node in nodes:
+            best = heapq.nlargest(top_n, graph.scores(node),
+                                  key=lambda item: item[1])
+            rows.extend(
+                FollowSuggestion(user_id=graph.ids[node],
+                                 author_id=graph.ids[candidate],
+                                 score=score)
+                for candidate, score in best
+            )
+        stale = FollowSuggestion.objects.all()
+        if previous_end is not None:
+            stale = stale.filter(user_id__gt=previous_end)
+        # Последняя пачка забирает и все id выше графа.
+        if nodes.stop < len(graph.ids):
+            stale = stale.filter(user_id__lte=graph.ids[nodes.stop - 1])
+        with transaction.atomic():
+            stale.delete()
+            FollowSuggestion.objects.bulk_create(rows)
+        total += len(rows)
+        previous_end = graph.ids[nodes.stop - 1]
+    if not graph.ids:
+        FollowSuggestion.objects.all().delete()
+    return total
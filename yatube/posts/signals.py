@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.models import MediaBlob
+from core.page_cache import invalidate_pages
+
+from . import lookups, pages
+from .models import (ArchivedPost, Comment, Follow, Group, GroupStats, Post,
+                     ProfileStats)
+
+# Поля пользователя, которые видны на страницах рядом с его постами
+# и комментариями.
+DISPLAYED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        with transaction.atomic():
+            ProfileStats.follow_changed(instance.user_id,
+                                        instance.author_id, 1)
+        pages.invalidate(user_ids={instance.user_id, instance.author_id},
+                         feed_ids={instance.user_id})
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    with transaction.atomic():
+        ProfileStats.follow_changed(instance.user_id, instance.author_id, -1)
+    pages.invalidate(user_ids={instance.user_id, instance.author_id},
+                     feed_ids={instance.user_id})
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, **kwargs):
+    old_image = getattr(instance, 'loaded_image', '')
+    new_image = instance.image.name or ''
+    if new_image != old_image:
+        MediaBlob.acquire(new_image)
+        MediaBlob.release(old_image)
+        instance.loaded_image = new_image
+
+
+@receiver(post_save, sender=Post)
+def post_group_saved(sender, instance, created, **kwargs):
+    old_group_id = (None if created
+                    else getattr(instance, 'loaded_group_id', None))
+    # Версия автора сбрасывается только ради нового поста: число
+    # постов автора видно на страницах всех его постов.
+    pages.invalidate(group_ids={old_group_id, instance.group_id},
+                     user_ids={instance.author_id}, post_ids={instance.pk},
+                     author_ids={instance.author_id} if created else ())
+    pages.invalidate_feeds_on_commit({instance.author_id})
+    if instance.group_id != old_group_id:
+        if not created:
+            # Ненайденные посты не кешируются, новому посту сбрасывать
+            # нечего.
+            lookups.posts.invalidate(pk=instance.pk)
+        GroupStats.post_changed(old_group_id, instance.pub_date, -1)
+        GroupStats.post_changed(instance.group_id, instance.pub_date, 1)
+        instance.loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_group_deleted(sender, instance, **kwargs):
+    GroupStats.post_changed(instance.group_id, instance.pub_date, -1)
+    pages.invalidate(group_ids={instance.group_id},
+                     user_ids={instance.author_id}, post_ids={instance.pk},
+                     author_ids={instance.author_id})
+    pages.invalidate_feeds_on_commit({instance.author_id})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    pages.invalidate(post_ids={instance.post_id})
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=ArchivedPost)
+def post_image_deleted(sender, instance, **kwargs):
+    MediaBlob.release(instance.image.name)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.delete(Group.CHOICES_CACHE_KEY)
+    lookups.groups.invalidate(instance.slug, pk=instance.pk)
+    # Название группы видно и на страницах ее постов.
+    invalidate_pages(pages.group_page(instance.pk),
+                     pages.group_info(instance.pk))
+
+
+def displayed_names(user):
+    return tuple(user.__dict__.get(field) for field in DISPLAYED_USER_FIELDS)
+
+
+@receiver(post_init, sender=get_user_model())
+def author_loaded(sender, instance, **kwargs):
+    # Имена из базы: при сохранении видно, поменялись ли они.
+    instance.loaded_names = displayed_names(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        # Вход на сайт не меняет ничего, что видно на страницах.
+        return
+    lookups.authors.invalidate(instance.username, pk=instance.pk)
+    pages.invalidate(user_ids={instance.pk}, feed_ids={instance.pk})
+    names = displayed_names(instance)
+    if names != getattr(instance, 'loaded_names', None):
+        # Полное сохранение без смены имени (вход, смена пароля)
+        # страниц с постами не трогает.
+        pages.invalidate_author(instance.pk)
+        instance.loaded_names = names
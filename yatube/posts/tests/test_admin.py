@@ -0,0 +1,192 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.page_cache import cache_page_swr
+from core.utils import EstimatedCountPaginator
+from posts import bulk
+from posts.models import Comment, Follow, Group, Post, PostScore
+
+User = get_user_model()
+
+
+class AdminPerformanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelists_open(self):
+        """Списки постов, комментариев и подписок открываются."""
+        for model in ('post', 'comment', 'follow', 'group'):
+            with self.subTest(model=model):
+                response = self.client.get(
+                    reverse(f'admin:posts_{model}_changelist'))
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_change_forms_use_raw_id_widgets(self):
+        """Формы комментария и подписки не выводят всех пользователей."""
+        for model, obj in (('comment', Comment.objects.get()),
+                           ('follow', Follow.objects.get())):
+            with self.subTest(model=model):
+                response = self.client.get(
+                    reverse(f'admin:posts_{model}_change', args=[obj.pk]))
+                self.assertContains(response, 'vForeignKeyRawIdAdminField')
+                self.assertNotContains(response, '<select name="author"')
+
+    def test_group_choices_are_cached(self):
+        """Список групп кешируется и сбрасывается при изменении группы."""
+        self.assertEqual(Group.cached_choices(),
+                         [(self.group.pk, 'Группа')])
+        with self.assertNumQueries(0):
+            Group.cached_choices()
+        Group.objects.create(title='Вторая', slug='second')
+        self.assertEqual(len(Group.cached_choices()), 2)
+
+    @override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_paginator_uses_planner_estimate(self):
+        """Без фильтров число строк берется из статистики базы."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Post.objects.create(text='Еще пост', author=self.author)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 1)
+        filtered = EstimatedCountPaginator(
+            Post.objects.filter(author=self.author), 10)
+        self.assertEqual(filtered.count, 2)
+
+    def test_filtered_count_is_cached_by_key(self):
+        """Точный счетчик кешируется по ключу из фильтров changelist."""
+        posts = Post.objects.filter(author=self.author)
+        self.assertEqual(
+            EstimatedCountPaginator(posts, 10, count_key='author').count, 1)
+        Post.objects.create(text='Еще пост', author=self.author)
+        with self.assertNumQueries(0):
+            cached = EstimatedCountPaginator(posts, 10, count_key='author')
+            self.assertEqual(cached.count, 1)
+
+    def test_group_is_editable_in_changelist(self):
+        """Группу можно сменить прямо в списке постов."""
+        url = reverse('admin:posts_post_changelist')
+        self.assertContains(self.client.get(url), 'name="form-0-group"')
+        other = Group.objects.create(title='Другая', slug='other')
+        self.client.post(url, {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+            'form-0-id': self.post.pk, 'form-0-group': other.pk,
+            '_save': 'Сохранить',
+        })
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, other)
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create(username='author')
+        cls.spammer = User.objects.create(username='spammer')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                      for i in range(3)]
+
+    def run_action(self, model, action, pks, **data):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            {'action': action, '_selected_action': pks, **data})
+
+    def test_reassign_group_is_single_update(self):
+        """Перенос в группу - один UPDATE постов на всю выборку."""
+        pks = [post.pk for post in self.posts[:2]]
+        with CaptureQueriesContext(connection) as queries:
+            updated = bulk.reassign_group(
+                Post.objects.filter(pk__in=pks), self.group.pk)
+        self.assertEqual(updated, 2)
+        post_updates = [query for query in queries.captured_queries
+                        if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(len(post_updates), 1)
+        self.run_action('post', 'reassign_group', [self.posts[2].pk],
+                        group=self.group.pk)
+        self.assertEqual(self.group.posts.count(), 3)
+
+    def test_delete_spam_removes_posts_and_comments(self):
+        """Удаление спама убирает посты вместе с комментариями."""
+        Comment.objects.create(
+            post=self.posts[0], author=self.spammer, text='спам')
+        PostScore.bump(self.posts[1].pk, 1)
+        self.run_action('post', 'delete_spam',
+                        [post.pk for post in self.posts[:2]])
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(PostScore.objects.exists())
+
+    def test_bulk_changes_invalidate_pages(self):
+        """Массовые изменения сбрасывают закешированную главную."""
+        calls = []
+
+        @cache_page_swr(20, key_prefix='index_page')
+        def view(request):
+            calls.append(1)
+            return HttpResponse('index')
+        request = RequestFactory().get('/')
+        view(request)
+        view(request)
+        bulk.delete_posts(Post.objects.filter(pk=self.posts[0].pk))
+        view(request)
+        self.assertEqual(len(calls), 2)
+
+    def test_purge_authors_comments(self):
+        """Удаляются все комментарии авторов выбранных комментариев."""
+        spam = [Comment.objects.create(post=post, author=self.spammer,
+                                       text='спам') for post in self.posts]
+        Comment.objects.create(
+            post=self.posts[0], author=self.author, text='по делу')
+        self.run_action('comment', 'purge_authors', [spam[0].pk])
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['по делу'])
+
+    def test_comment_deletion_invalidates_once(self):
+        """Комментарии удаляются одним DELETE, страницы - одним сбросом."""
+        for post in self.posts:
+            for i in range(5):
+                Comment.objects.create(
+                    post=post, author=self.spammer, text=f'спам {i}')
+        with mock.patch('posts.pages.invalidate_pages') as invalidate:
+            with CaptureQueriesContext(connection) as queries:
+                deleted = bulk.purge_comments(
+                    User.objects.filter(pk=self.spammer.pk))
+        self.assertEqual(deleted, 15)
+        self.assertEqual(invalidate.call_count, 1)
+        comment_deletes = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('DELETE FROM "posts_comment"')]
+        self.assertEqual(len(comment_deletes), 1)
+        Comment.objects.create(
+            post=self.posts[0], author=self.spammer, text='спам')
+        with mock.patch('posts.pages.invalidate_pages') as invalidate:
+            bulk.delete_posts(Post.objects.all())
+        self.assertEqual(invalidate.call_count, 1)
+        self.assertFalse(Comment.objects.exists())
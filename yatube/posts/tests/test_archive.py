@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.utils import WindowedPaginator
+from posts.archive import ChainedPosts, archive_posts
+from posts.models import ArchivedComment, ArchivedPost, Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_SIZE=2)
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='archivist')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.user)
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=timezone.now() - timedelta(days=400))
+        Comment.objects.create(post=cls.old_post, author=cls.user,
+                               text='Старый комментарий')
+        for i in range(2):
+            Post.objects.create(text=f'Новый пост {i}', author=cls.user)
+
+    def test_archive_moves_posts_with_comments(self):
+        """Старые посты и их комментарии переносятся в архив."""
+        moved = archive_posts(timezone.now() - timedelta(days=365))
+        self.assertEqual(moved, 1)
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertTrue(
+            ArchivedPost.objects.filter(pk=self.old_post.pk).exists())
+        self.assertEqual(ArchivedComment.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_archived_post_detail(self):
+        """Архивный пост доступен по старому адресу и кешируется."""
+        archive_posts(timezone.now() - timedelta(days=365))
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.old_post.pk,)))
+        self.assertContains(response, 'Старый комментарий')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_profile_last_page_shows_archived(self):
+        """Последняя страница профиля показывает архивные посты."""
+        archive_posts(timezone.now() - timedelta(days=365))
+        response = self.client.get(
+            reverse('posts:profile', args=(self.user.username,)) + '?page=2')
+        self.assertEqual(response.context['post_count'], 3)
+        self.assertEqual(list(response.context['page_obj'])[0].pk,
+                         self.old_post.pk)
+
+    @override_settings(PAGINATOR_MAX_COUNT=2)
+    def test_chained_count_is_capped(self):
+        """Пагинатор профиля считает посты не дальше предела."""
+        archive_posts(timezone.now() - timedelta(days=365))
+        posts = ChainedPosts(self.user.post_set.all(),
+                             self.user.archived_posts.all())
+        self.assertEqual(posts.capped_count(3), 3)
+        self.assertEqual(posts.capped_count(1), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(WindowedPaginator(posts, 2).truncated)
+        self.assertTrue(all('LIMIT' in query['sql']
+                            for query in queries.captured_queries))
+        self.assertEqual([post.pk for post in posts[1:3]],
+                         [posts[1].pk, self.old_post.pk])
+
+    def test_archived_ids_are_not_reused(self):
+        """Новый пост не получает id поста, ушедшего в архив."""
+        newest = Post.objects.create(text='Самый новый', author=self.user)
+        Post.objects.filter(pk=newest.pk).update(
+            pub_date=timezone.now() - timedelta(days=400))
+        archive_posts(timezone.now() - timedelta(days=365))
+        post = Post.objects.create(text='После архивации', author=self.user)
+        self.assertGreater(post.pk, newest.pk)
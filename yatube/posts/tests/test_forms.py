@@ -7,10 +7,19 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.models import MediaBlob
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -51,9 +60,23 @@ class PostCreateEditFormTest(TestCase):
                                                args=(self.user.username,)))
         new_post = Post.objects.latest('id')
         self.assertEqual(new_post.text, data['text'])
-        self.assertTrue(
-            'posts/' + uploaded.name in new_post.image.url
-        )
+        self.assertRegex(new_post.image.name,
+                         r'^posts/\w\w/\w\w/[0-9a-f]{64}\.gif$')
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом со счетчиком ссылок."""
+        url = reverse('posts:post_create')
+        for name in ('first.gif', 'second.gif'):
+            uploaded = SimpleUploadedFile(name=name, content=SMALL_GIF,
+                                          content_type='image/gif')
+            self.client.post(url, {'text': name, 'image': uploaded})
+        first, second = Post.objects.exclude(image='').order_by('id')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refs,
+                         2)
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=second.image.name).refs,
+                         1)
 
     def test_edit_post(self):
         """Тест отправки валидной формы при редактировании поста."""
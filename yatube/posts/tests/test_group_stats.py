@@ -0,0 +1,89 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import bulk
+from posts.models import Group, GroupStats, Post, hour_of
+
+User = get_user_model()
+
+
+class GroupStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.first = Group.objects.create(title='Первая', slug='first')
+        cls.second = Group.objects.create(title='Вторая', slug='second')
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_created_post_is_counted(self):
+        """Новый пост увеличивает счетчики группы."""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.first)
+        stats = self.stats(self.first)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.posts_last_day, 1)
+        self.assertEqual(stats.last_post, post.pub_date)
+
+    def test_group_change_moves_counters(self):
+        """Смена группы переносит пост между счетчиками."""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.first)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.second
+        post.save()
+        self.assertEqual(self.stats(self.first).posts_count, 0)
+        self.assertIsNone(self.stats(self.first).last_post)
+        self.assertEqual(self.stats(self.second).posts_last_day, 1)
+
+    def test_delete_restores_last_post(self):
+        """После удаления последнего поста берется предыдущий."""
+        older = Post.objects.create(
+            text='Старый', author=self.author, group=self.first)
+        newer = Post.objects.create(
+            text='Новый', author=self.author, group=self.first)
+        newer.delete()
+        stats = self.stats(self.first)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.last_post, older.pub_date)
+
+    def test_day_window_rolls(self):
+        """Посты старше суток выпадают из счетчика за сутки."""
+        Post.objects.create(text='Пост', author=self.author,
+                            group=self.first)
+        stats = self.stats(self.first)
+        stats.roll(hour_of(timezone.now() + timedelta(hours=25)))
+        self.assertEqual(stats.posts_last_day, 0)
+        self.assertEqual(stats.posts_count, 1)
+
+    def test_bulk_actions_recount(self):
+        """Массовый перенос пересчитывает обе группы."""
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author,
+                                     group=self.first) for i in range(3)]
+        bulk.reassign_group(
+            Post.objects.filter(pk__in=[posts[0].pk, posts[1].pk]),
+            self.second.pk)
+        self.assertEqual(self.stats(self.first).posts_count, 1)
+        self.assertEqual(self.stats(self.second).posts_count, 2)
+        call_command('refresh_group_stats', '--recount', stdout=StringIO())
+        self.assertEqual(self.stats(self.second).posts_last_day, 2)
+
+    def test_directory_sorted_by_activity(self):
+        """Каталог групп сортируется по активности без агрегации."""
+        Post.objects.create(text='Пост', author=self.author,
+                            group=self.second)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('posts:group_directory'))
+            groups = list(response.context['page_obj'])
+        self.assertEqual(groups, [self.second, self.first])
+        response = self.client.get(
+            reverse('posts:group_directory'), {'sort': 'title'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.second, self.first])
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default, get_thumbnail
+
+from core.models import MediaBlob
+from core.storage import content_storage
+from posts.models import Post
+from posts.tests.test_forms import SMALL_GIF
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+OLD = time.time() - 60 * 60 * 48
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGCTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def make_file(self, name, mtime=OLD):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'data')
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gc')
+        self.kept = self.make_file('posts/ab/cd/kept.gif')
+        Post.objects.create(text='Пост', author=self.user,
+                            image='posts/ab/cd/kept.gif')
+        self.orphan = self.make_file('posts/orphan.gif')
+        self.fresh = self.make_file('posts/fresh.gif', mtime=time.time())
+        self.thumbnail = self.make_file('cache/12/34/thumb.jpg')
+
+    def test_dry_run_keeps_files(self):
+        """Пробный запуск ничего не удаляет."""
+        call_command('media_gc', dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(self.thumbnail))
+
+    def test_deletes_only_old_orphans(self):
+        """Удаляются старые файлы без ссылок из базы."""
+        call_command('media_gc', stdout=StringIO())
+        self.assertTrue(os.path.exists(self.kept))
+        self.assertTrue(os.path.exists(self.fresh))
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertFalse(os.path.exists(self.thumbnail))
+
+    def test_released_image_drops_thumbnails(self):
+        """Картинка без ссылок уходит вместе с миниатюрами из kvstore."""
+        name = content_storage.save('posts/small.gif', ContentFile(SMALL_GIF))
+        post = Post.objects.create(text='С картинкой', author=self.user,
+                                   image=name)
+        thumbnail = get_thumbnail(post.image, '1x1')
+        self.assertTrue(thumbnail.exists())
+        post.delete()
+        # В TestCase on_commit не срабатывает, поэтому вызываем сами.
+        MediaBlob.purge(name)
+        self.assertFalse(content_storage.exists(name))
+        self.assertFalse(thumbnail.exists())
+        self.assertIsNone(default.kvstore.get(thumbnail))
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Follow, FollowSuggestion
+from posts.recommendations import FollowGraph, build_suggestions
+
+User = get_user_model()
+
+
+class RecommendationsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.star, cls.other = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'star', 'other')
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.star)
+        Follow.objects.create(user=cls.friend, author=cls.reader)
+        Follow.objects.create(user=cls.other, author=cls.friend)
+
+    def test_graph_csr(self):
+        """Граф подписок раскладывается в CSR-массивы."""
+        graph = FollowGraph.load()
+        friend = graph.ids.index(self.friend.pk)
+        self.assertEqual(
+            sorted(graph.ids[i] for i in graph.following(friend)),
+            sorted([self.star.pk, self.reader.pk]))
+        self.assertEqual(len(graph.followers(friend)), 2)
+
+    def test_friends_of_friends_suggested(self):
+        """Подписки подписок попадают в рекомендации, сам читатель - нет."""
+        build_suggestions()
+        authors = list(FollowSuggestion.objects.filter(
+            user=self.reader).values_list('author', flat=True))
+        self.assertEqual(authors, [self.star.pk])
+
+    def test_feed_shows_suggestions(self):
+        """Лента подписок показывает готовые рекомендации."""
+        build_suggestions()
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'На кого подписаться')
+        self.assertContains(response, self.star.username)
+
+    def test_small_batches_replace_old_rows(self):
+        """Пачки по одному пользователю заменяют старые рекомендации."""
+        FollowSuggestion.objects.create(
+            user=self.star, author=self.other, score=1)
+        build_suggestions(batch_size=1)
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=self.star).exists())
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=self.reader)
+                 .values_list('author', flat=True)),
+            [self.star.pk])
+
+    def test_users_between_batches_are_cleared(self):
+        """Рекомендации пользователя между пачками не остаются."""
+        lurker = User.objects.create_user(username='lurker')
+        reader = User.objects.create_user(username='late')
+        Follow.objects.create(user=reader, author=self.friend)
+        FollowSuggestion.objects.create(
+            user=lurker, author=self.star, score=1)
+        build_suggestions(batch_size=1)
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=lurker).exists())
+
+    def test_edges_outside_ids_are_skipped(self):
+        """Подписка, которой нет в списке id, не попадает в граф."""
+        graph = FollowGraph([1, 2], [(1, 2), (1, 3), (4, 2)])
+        self.assertEqual(list(graph.following(0)), [1])
+        self.assertEqual(list(graph.followers(1)), [0])
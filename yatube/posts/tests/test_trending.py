@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, PostScore
+
+User = get_user_model()
+
+
+@override_settings(TRENDING_VIEWS_PER_WRITE=2, TRENDING_VIEW_WEIGHT=0.5,
+                   TRENDING_HALF_LIFE_HOURS=1)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.quiet = Post.objects.create(text='Тихий', author=cls.author)
+        cls.hot = Post.objects.create(text='Горячий', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def comment(self, post):
+        self.client.post(reverse('posts:add_comment', args=[post.pk]),
+                         {'text': 'Комментарий'})
+
+    def test_comments_raise_score(self):
+        """Комментарий поднимает пост в ленте популярного."""
+        self.comment(self.hot)
+        self.comment(self.hot)
+        self.comment(self.quiet)
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.hot, self.quiet])
+
+    def test_views_are_written_in_batches(self):
+        """Просмотры пишутся в базу раз в несколько просмотров."""
+        url = reverse('posts:post_detail', args=[self.quiet.pk])
+        self.client.get(url)
+        self.assertFalse(PostScore.objects.exists())
+        self.client.get(url)
+        self.assertEqual(PostScore.objects.get().score, 1.0)
+
+    def test_decay_halves_and_prunes(self):
+        """Затухание уменьшает рейтинги и удаляет остывшие."""
+        PostScore.bump(self.hot.pk, 4)
+        PostScore.bump(self.quiet.pk, 0.015)
+        call_command('decay_trending', '--hours', '1', stdout=StringIO())
+        self.assertEqual(list(PostScore.objects.values_list('score',
+                                                            flat=True)),
+                         [2.0])
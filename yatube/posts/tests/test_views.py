@@ -1,10 +1,20 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from posts.models import Follow, Group, Post
+from posts.archive import archive_posts
+from posts.models import Comment, Follow, Group, Post, ProfileStats
 
 User = get_user_model()
 
@@ -211,3 +221,259 @@ class FollowTests(TestCase):
         """Проверяем непоявление в ленте подписчика."""
         response = self.another_client.get(self.follow_index_url)
         self.assertNotIn(self.post, response.context['page_obj'])
+
+
+class FollowStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='popular')
+        cls.readers = [User.objects.create_user(username=f'reader{i}')
+                       for i in range(3)]
+
+    def follow(self, reader, action='posts:profile_follow'):
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse(action, args=(self.author.username,)))
+
+    def test_counters_follow_unfollow(self):
+        """Счетчики подписок меняются при подписке и отписке."""
+        for reader in self.readers:
+            self.follow(reader)
+        self.follow(self.readers[0])
+        self.follow(self.readers[1], 'posts:profile_unfollow')
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual(stats.followers_count, 2)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.readers[1]).following_count, 0)
+
+    @override_settings(PAGE_SIZE=2)
+    def test_followers_keyset_pages(self):
+        """Список подписчиков листается по ключу."""
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+        url = reverse('posts:followers', args=(self.author.username,))
+        response = self.client.get(url)
+        self.assertEqual(response.context['users'],
+                         [self.readers[2], self.readers[1]])
+        next_after = response.context['page'].next_after
+        response = self.client.get(url, {'after': next_after})
+        self.assertEqual(response.context['users'], [self.readers[0]])
+        self.assertIsNone(response.context['page'].next_after)
+
+    def test_follow_is_single_insert(self):
+        """Подписка - один INSERT, повторная ничего не меняет."""
+        self.assertTrue(Follow.objects.follow(self.readers[0].pk,
+                                              self.author.pk))
+        self.assertFalse(Follow.objects.follow(self.readers[0].pk,
+                                               self.author.pk))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.author).followers_count, 1)
+
+    def test_import_follows(self):
+        """Импорт подписок из CSV с пересчетом счетчиков."""
+        Follow.objects.follow(self.readers[0].pk, self.author.pk)
+        Post.objects.create(text='Пост для ленты', author=self.author)
+        self.client.force_login(self.readers[2])
+        feed_url = reverse('posts:follow_index')
+        self.assertNotContains(self.client.get(feed_url), 'Пост для ленты')
+        rows = [f'{reader.pk},{self.author.pk}' for reader in self.readers]
+        rows += [f'{self.author.pk},{self.author.pk}', '999999,1']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as source:
+            source.write('user_id,author_id\n' + '\n'.join(rows))
+            source.flush()
+            call_command('import_follows', source.name, stdout=StringIO())
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.author).followers_count, 3)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.readers[2]).following_count,
+            1)
+        self.assertContains(self.client.get(feed_url), 'Пост для ленты')
+
+
+class LookupCacheViewTests(TestCase):
+    def test_group_lookup_is_cached_and_invalidated(self):
+        """Группа по slug кешируется, изменение группы сбрасывает кеш."""
+        group = Group.objects.create(title='Группа', slug='cached-slug')
+        url = reverse('posts:group_list', args=['cached-slug'])
+        self.client.force_login(User.objects.create(username='reader'))
+        self.client.get(url)
+        # Остается только подсчет постов группы.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        group.slug = 'renamed-slug'
+        group.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_new_author_is_found_at_once(self):
+        """Отсутствие автора не кешируется: новый профиль открывается."""
+        url = reverse('posts:profile', args=['nobody-here'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        User.objects.create(username='nobody-here')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SplitPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='split')
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_come_from_cache(self):
+        """Повторный анонимный запрос отдается из кеша без запросов."""
+        for url in (reverse('posts:group_list', args=['split']),
+                    reverse('posts:profile', args=['writer']),
+                    reverse('posts:post_detail', args=[self.post.pk])):
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertIsNone(response.context)
+
+    def test_new_post_invalidates_group_and_profile(self):
+        """Новый пост сбрасывает страницы своей группы и автора."""
+        group_url = reverse('posts:group_list', args=['split'])
+        profile_url = reverse('posts:profile', args=['writer'])
+        self.client.get(group_url)
+        self.client.get(profile_url)
+        Post.objects.create(text='Второй пост', author=self.author,
+                            group=self.group)
+        self.assertContains(self.client.get(group_url), 'Второй пост')
+        self.assertContains(self.client.get(profile_url), 'Второй пост')
+
+    def test_logged_in_user_gets_personal_parts(self):
+        """Вошедший видит свою шапку и форму комментария."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        reader = User.objects.create(username='reader')
+        self.client.force_login(reader)
+        response = self.client.get(url)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'Новый комментарий'})
+        self.client.logout()
+        self.assertContains(self.client.get(url), 'Новый комментарий')
+
+    def test_deleted_comment_leaves_cached_page(self):
+        """Комментарий, удаленный в админке, пропадает со страницы."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Спам в комментарии')
+        self.assertContains(self.client.get(url), 'Спам в комментарии')
+        comment.delete()
+        self.assertNotContains(self.client.get(url), 'Спам в комментарии')
+
+    def test_rename_invalidates_pages_with_author(self):
+        """Новое имя автора видно на главной, в группе и на посте."""
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=['split']),
+                reverse('posts:post_detail', args=[self.post.pk]))
+        for url in urls:
+            self.client.get(url)
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.context)
+
+    def test_save_without_rename_keeps_pages(self):
+        """Сохранение без смены имени не перебирает посты автора."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        with CaptureQueriesContext(connection) as queries:
+            author.save()
+        self.assertFalse(any('"posts_' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertIsNone(self.client.get(url).context)
+
+    def test_post_page_follows_group_and_author(self):
+        """Страница поста видит новое название группы и число постов."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.client.get(url), 'Новое название')
+        Post.objects.create(text='Второй пост', author=self.author)
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(response.context['post_count'], 2)
+
+
+class FollowFeedCacheTests(TransactionTestCase):
+    """Ленты сбрасываются после коммита, поэтому нужны настоящие
+    транзакции."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='writer')
+        self.readers = [User.objects.create(username=f'reader{i}')
+                        for i in range(3)]
+        for reader in self.readers:
+            Follow.objects.create(user=reader, author=self.author)
+        Post.objects.create(text='Первый пост', author=self.author)
+        self.url = reverse('posts:follow_index')
+
+    def feed(self, reader):
+        self.client.force_login(reader)
+        return self.client.get(self.url)
+
+    def test_repeat_visit_comes_from_cache(self):
+        """Повторный заход в ленту отдается из кеша без рендера."""
+        self.assertIsNotNone(self.feed(self.readers[0]).context)
+        response = self.feed(self.readers[0])
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Первый пост')
+
+    def test_feeds_are_per_user(self):
+        """Лента одного читателя не отдается другому."""
+        stranger = User.objects.create(username='stranger')
+        self.feed(self.readers[0])
+        response = self.feed(stranger)
+        self.assertIsNotNone(response.context)
+        self.assertNotContains(response, 'Первый пост')
+
+    def test_new_post_invalidates_all_followers(self):
+        """Новый пост сбрасывает ленты всех подписчиков без их обхода."""
+        for reader in self.readers:
+            self.feed(reader)
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(text='Второй пост', author=self.author)
+        self.assertFalse(any('posts_follow' in query['sql']
+                             for query in queries.captured_queries))
+        for reader in self.readers:
+            with self.subTest(reader=reader.username):
+                self.assertContains(self.feed(reader), 'Второй пост')
+
+    def test_follow_changes_invalidate_feed(self):
+        """Подписка и отписка сбрасывают ленту читателя."""
+        other = User.objects.create(username='other')
+        Post.objects.create(text='Чужой пост', author=other)
+        reader = self.readers[0]
+        self.assertNotContains(self.feed(reader), 'Чужой пост')
+        self.client.get(reverse('posts:profile_follow', args=['other']))
+        self.assertContains(self.feed(reader), 'Чужой пост')
+        self.client.get(reverse('posts:profile_unfollow', args=['other']))
+        self.assertNotContains(self.feed(reader), 'Чужой пост')
+
+    def test_archive_batch_skips_followers(self):
+        """Архивация пачки постов не обходит подписчиков."""
+        for i in range(3):
+            Post.objects.create(text=f'Старый пост {i}', author=self.author)
+        Post.objects.update(pub_date=timezone.now() - timedelta(days=400))
+        self.feed(self.readers[0])
+        with CaptureQueriesContext(connection) as queries:
+            archive_posts(timezone.now() - timedelta(days=365))
+        self.assertFalse(any('posts_follow' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertNotContains(self.feed(self.readers[0]), 'Старый пост')
@@ -0,0 +1,61 @@
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.management.commands.warm_caches import Command, top_paths_from_log
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class WarmCachesTests(TransactionTestCase):
+    def test_top_paths_from_log(self):
+        """Из лога берутся самые частые успешные GET-адреса."""
+        lines = [
+            '1.1.1.1 - - [t] "GET /group/a/ HTTP/1.1" 200 512',
+            '1.1.1.1 - - [t] "GET /group/a/ HTTP/1.1" 200 512',
+            '1.1.1.1 - - [t] "GET /static/x.css HTTP/1.1" 200 10',
+            '1.1.1.1 - - [t] "GET /missing/ HTTP/1.1" 404 10',
+            '1.1.1.1 - - [t] "GET /?page=2 HTTP/1.1" 200 512',
+        ]
+        with tempfile.NamedTemporaryFile('w') as log:
+            log.write('\n'.join(lines) + '\n')
+            log.flush()
+            self.assertEqual(top_paths_from_log(log.name, 10),
+                             ['/group/a/', '/?page=2'])
+
+    def test_popular_groups_come_from_stats(self):
+        """Популярные группы берутся из GroupStats, посты не считаются."""
+        user = User.objects.create_user(username='ranker')
+        quiet = Group.objects.create(title='Тихая', slug='quiet')
+        busy = Group.objects.create(title='Шумная', slug='busy')
+        Post.objects.create(text='Пост', author=user, group=quiet)
+        for _ in range(2):
+            Post.objects.create(text='Пост', author=user, group=busy)
+        with CaptureQueriesContext(connection) as queries:
+            paths = Command().popular_paths(10)
+        self.assertEqual(paths[:2], ['/group/busy/', '/group/quiet/'])
+        self.assertFalse(any('posts_post' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_warm_caches_fills_index_cache(self):
+        """После прогрева главная страница уже в кеше."""
+        cache.clear()
+        user = User.objects.create_user(username='warm')
+        group = Group.objects.create(title='Группа', slug='warm-group',
+                                     description='Описание')
+        Post.objects.create(text='Пост для прогрева', author=user,
+                            group=group)
+        out = StringIO()
+        call_command('warm_caches', threads=1, host='testserver',
+                     stdout=out)
+        self.assertIn('200 OK /group/warm-group/', out.getvalue())
+        Post.objects.all().delete()
+        response = self.client.get('/')
+        self.assertContains(response, 'Пост для прогрева')
@@ -9,6 +9,12 @@ urlpatterns = [
     path('', views.index,
          name='index'),
 
+    # Популярные посты
+    path('trending/', views.trending, name='trending'),
+
+    # Каталог групп
+    path('groups/', views.group_directory, name='group_directory'),
+
     path('group/<slug:slug>/',
          views.group_posts,
          name='group_list'),
@@ -50,4 +56,14 @@ urlpatterns = [
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow,
          name='profile_unfollow'),
+
+    # Подписчики пользователя
+    path('profile/<str:username>/followers/',
+         views.followers,
+         name='followers'),
+
+    # Подписки пользователя
+    path('profile/<str:username>/following/',
+         views.following,
+         name='following'),
 ]
@@ -1,37 +1,117 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
+from django.db.models import F
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.cache import patch_cache_control
 
-from core.utils import paginator
+from core.page_cache import cache_page_swr, page_version
+from core.utils import keyset_paginator, paginator
 
+from . import pages
+from .archive import ChainedPosts, author_post_count
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .lookups import get_author_or_404, get_group_or_404, get_post_owner
+from .models import (ArchivedPost, Comment, Follow, FollowSuggestion, Group,
+                     Post, PostScore, ProfileStats)
 
 
-@cache_page(20, key_prefix='index_page')
+def follow_suggestions(user):
+    """Готовые рекомендации подписок: один запрос, без вычислений."""
+    if not user.is_authenticated:
+        return FollowSuggestion.objects.none()
+    return (FollowSuggestion.objects.filter(user=user,
+                                            author__is_active=True)
+            .select_related('author')[:settings.SUGGESTIONS_COUNT])
+
+
+# Анонимам страницы отдаются целиком из кеша. Вошедшим рендерится
+# только личное (шапка, подписка, форма комментария, правка), а общая
+# часть берется из {% cache %} с той же версией, что и у страницы.
+def group_page_prefix(request, slug):
+    return pages.group_page(get_group_or_404(slug).pk)
+
+
+def profile_page_prefix(request, username):
+    return pages.profile_page(get_author_or_404(username).pk)
+
+
+def post_page_prefix(request, post_id):
+    post = get_post_owner(post_id)
+    if post is None:
+        return pages.post_page(post_id)
+    return pages.post_prefixes(post)
+
+
+def feed_page_prefix(request):
+    author_ids = Follow.objects.filter(user=request.user).values_list(
+        'author', flat=True)
+    return pages.feed_prefixes(request.user.pk, author_ids)
+
+
+@cache_page_swr(20, key_prefix=pages.INDEX_PAGE, anonymous_only=True)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.filter(author__is_active=True)
     page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        'page_version': page_version(pages.INDEX_PAGE),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_swr(settings.PAGE_CACHE_TIMEOUT, key_prefix=group_page_prefix,
+                anonymous_only=True)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    page_obj = paginator(request, group.posts.all())
+    group = get_group_or_404(slug)
+    page_obj = paginator(request,
+                         group.posts.filter(author__is_active=True))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'page_version': page_version(pages.group_page(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def trending(request):
+    page_obj = paginator(request, PostScore.top(settings.TRENDING_SIZE))
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+# Сортировки каталога групп: только по готовым полям GroupStats.
+GROUP_ORDERINGS = {
+    'active': ('Активные за сутки',
+               F('stats__posts_last_day').desc(nulls_last=True)),
+    'recent': ('Недавние', F('stats__last_post').desc(nulls_last=True)),
+    'posts': ('Больше постов', F('stats__posts_count').desc(nulls_last=True)),
+    'title': ('По названию', F('title').asc()),
+}
+
+
+def group_directory(request):
+    sort = request.GET.get('sort')
+    if sort not in GROUP_ORDERINGS:
+        sort = 'active'
+    groups = (Group.objects.select_related('stats')
+              .order_by(GROUP_ORDERINGS[sort][1], 'title'))
+    context = {
+        'page_obj': paginator(request, groups),
+        'sort': sort,
+        'orderings': {key: title
+                      for key, (title, _) in GROUP_ORDERINGS.items()},
+        'page_query': f'sort={sort}&',
+    }
+    return render(request, 'posts/group_directory.html', context)
+
+
+@cache_page_swr(settings.PAGE_CACHE_TIMEOUT, key_prefix=profile_page_prefix,
+                anonymous_only=True)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.post_set.all()
+    user = get_author_or_404(username)
+    post_list = ChainedPosts(user.post_set.all(), user.archived_posts.all())
     page_obj = paginator(request, post_list)
     following = False
     if request.user.is_authenticated:
@@ -41,26 +121,64 @@ def profile(request, username):
     context = {
         'author': user,
         'page_obj': page_obj,
-        'post_count': user.post_set.count(),
+        'post_count': post_list.count(),
         'following': following,
+        'stats': ProfileStats.objects.filter(user=user).first(),
+        'suggestions': follow_suggestions(request.user),
+        'page_version': page_version(pages.profile_page(user.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id: int):
-    post = get_object_or_404(Post, pk=post_id)
-    post_list = post.author.post_set.count()
-    comments = Comment.objects.filter(post=post)
+    response = post_page(request, post_id)
+    if response.status_code == 200:
+        PostScore.record_view(post_id)
+    return response
+
+
+@cache_page_swr(settings.PAGE_CACHE_TIMEOUT, key_prefix=post_page_prefix,
+                anonymous_only=True)
+def post_page(request, post_id: int):
+    post = Post.objects.filter(pk=post_id, author__is_active=True).first()
+    if post is None:
+        return archived_post_detail(request, post_id)
+    post_list = author_post_count(post.author)
+    comments = Comment.objects.filter(post=post, author__is_active=True)
     form = CommentForm()
     context = {
         'post': post,
         'post_count': post_list,
         'comments': comments,
         'form': form,
+        'page_version': page_version(*pages.post_prefixes(post)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def archived_post_detail(request, post_id: int):
+    post = get_object_or_404(ArchivedPost, pk=post_id,
+                             author__is_active=True)
+    comments = post.comments.filter(author__is_active=True)
+    context = {
+        'post': post,
+        'post_count': author_post_count(post.author),
+        'comments': comments.select_related('author'),
+        'archived': True,
+        'page_version': page_version(*pages.post_prefixes(post)),
+    }
+    response = render(request, 'posts/post_detail.html', context)
+    # Архивный пост больше не меняется: ни правок, ни комментариев.
+    patch_cache_control(
+        response, max_age=settings.ARCHIVE_CACHE_SECONDS, immutable=True
+    )
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True)
+    else:
+        patch_cache_control(response, public=True)
+    return response
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -104,29 +222,66 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        PostScore.bump(post.pk, settings.TRENDING_COMMENT_WEIGHT)
     return redirect('posts:post_detail', post_id=post.id)
 
 
 @login_required
+@cache_page_swr(settings.FEED_CACHE_TIMEOUT, key_prefix=feed_page_prefix)
 def follow_index(request):
     following = Follow.objects.filter(user=request.user).values_list('author',
                                                                      flat=True)
-    post_list = Post.objects.filter(author__in=following)
+    post_list = Post.objects.filter(author__in=following,
+                                    author__is_active=True)
     page_obj = paginator(request, post_list)
-    context = {'page_obj': page_obj}
+    context = {
+        'page_obj': page_obj,
+        'suggestions': follow_suggestions(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    author = get_author_or_404(username)
+    if (request.user != author
+            and Follow.objects.follow(request.user.pk, author.pk)):
+        # Подписка создается без сигналов, страницы сбрасываются здесь.
+        pages.invalidate(user_ids={request.user.pk, author.pk},
+                         feed_ids={request.user.pk})
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_author_or_404(username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+def followers(request, username):
+    author = get_author_or_404(username)
+    page = keyset_paginator(
+        request, Follow.objects.filter(author=author, user__is_active=True)
+        .select_related('user'))
+    context = {
+        'author': author,
+        'users': [follow.user for follow in page],
+        'page': page,
+        'title': 'Подписчики',
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def following(request, username):
+    user = get_author_or_404(username)
+    page = keyset_paginator(
+        request, Follow.objects.filter(user=user, author__is_active=True)
+        .select_related('author'))
+    context = {
+        'author': user,
+        'users': [follow.author for follow in page],
+        'page': page,
+        'title': 'Подписки',
+    }
+    return render(request, 'posts/follow_list.html', context)
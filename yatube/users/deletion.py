@@ -0,0 +1,89 @@
+"""Фоновое удаление аккаунтов.
+
+request_deletion сразу скрывает аккаунт, а purge_accounts удаляет его
+данные небольшими пачками по возрастанию pk. Каждая пачка - отдельная
+транзакция, прогресс хранится в AccountDeletion, поэтому прерванное
+удаление продолжается с того же места и не держит базу надолго.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from posts import pages
+from posts.models import (ArchivedComment, ArchivedPost, Comment, Follow,
+                          FollowSuggestion, Post)
+
+from .models import AccountDeletion
+
+User = get_user_model()
+
+# Что удаляется и в каком порядке: сначала подписки, чтобы счетчики
+# подписок быстрее перестали учитывать скрытый аккаунт, затем зависимые
+# строки, чтобы каскад при удалении следующих ничего не собирал.
+STAGES = (
+    lambda user_id: Follow.objects.filter(user_id=user_id),
+    lambda user_id: Follow.objects.filter(author_id=user_id),
+    lambda user_id: ArchivedComment.objects.filter(author_id=user_id),
+    lambda user_id: ArchivedComment.objects.filter(post__author_id=user_id),
+    lambda user_id: ArchivedPost.objects.filter(author_id=user_id),
+    lambda user_id: Comment.objects.filter(author_id=user_id),
+    lambda user_id: Comment.objects.filter(post__author_id=user_id),
+    lambda user_id: Post.objects.filter(author_id=user_id),
+    lambda user_id: FollowSuggestion.objects.filter(author_id=user_id),
+    lambda user_id: FollowSuggestion.objects.filter(user_id=user_id),
+)
+
+
+def request_deletion(user):
+    """Скрывает аккаунт и ставит его данные в очередь на удаление.
+
+    Страницы сбрасываются через версию автора, посты по одному
+    сбросят стадии удаления.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        deletion, _ = AccountDeletion.objects.get_or_create(
+            user_id=user.pk, defaults={'username': user.username})
+    pages.invalidate_author(user.pk)
+    return deletion
+
+
+def purge_batch(deletion, batch_size):
+    """Удаляет одну пачку; возвращает False, когда аккаунт удален."""
+    with transaction.atomic():
+        deletion = AccountDeletion.objects.select_for_update().get(
+            pk=deletion.pk)
+        if deletion.finished:
+            return False
+        if deletion.stage >= len(STAGES):
+            User.objects.filter(pk=deletion.user_id).delete()
+            deletion.finished = timezone.now()
+            deletion.save()
+            return False
+        queryset = STAGES[deletion.stage](deletion.user_id)
+        ids = list(queryset.filter(pk__gt=deletion.last_pk).order_by('pk')
+                   .values_list('pk', flat=True)[:batch_size])
+        if ids:
+            # delete() по небольшой пачке: сигналы (счетчики, картинки)
+            # отрабатывают, а в память попадает не больше batch_size строк.
+            queryset.model.objects.filter(pk__in=ids).delete()
+            deletion.last_pk = ids[-1]
+            deletion.deleted_rows += len(ids)
+        else:
+            deletion.stage += 1
+            deletion.last_pk = 0
+        deletion.save()
+    return True
+
+
+def purge_accounts(batch_size=None):
+    """Доводит до конца все незавершенные удаления аккаунтов."""
+    batch_size = batch_size or settings.ACCOUNT_DELETION_BATCH_SIZE
+    finished = 0
+    for deletion in AccountDeletion.objects.filter(finished__isnull=True):
+        while purge_batch(deletion, batch_size):
+            pass
+        finished += 1
+    return finished
@@ -1,8 +1,10 @@
 from django import forms
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+from django.template import loader
 
 from .models import Contact
+from .outbox import enqueue_mail
 
 User = get_user_model()
 
@@ -13,6 +15,21 @@ class CreationForm(UserCreationForm):
         fields = ('first_name', 'last_name', 'username', 'email')
 
 
+class OutboxPasswordResetForm(PasswordResetForm):
+    """Письмо для сброса пароля уходит в очередь, а не отправляется."""
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name,
+                                                context)
+        enqueue_mail(subject, body, from_email, [to_email], html_body)
+
+
 class ContactForm(forms.ModelForm):
     class Meta:
         model = Contact
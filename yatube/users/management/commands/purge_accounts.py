@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.deletion import purge_accounts
+
+
+class Command(BaseCommand):
+    help = 'Удаляет данные аккаунтов, поставленных в очередь на удаление.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.ACCOUNT_DELETION_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая очередь.')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Пауза между опросами пустой очереди.')
+
+    def handle(self, *args, **options):
+        while True:
+            finished = purge_accounts(options['batch_size'])
+            if finished:
+                self.stdout.write(f'Удалено аккаунтов: {finished}')
+            if not options['loop']:
+                return
+            if not finished:
+                time.sleep(options['interval'])
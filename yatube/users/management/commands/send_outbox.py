@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.outbox import deliver_outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая очередь.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза между опросами пустой очереди.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_outbox(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(
+                    f'Отправлено: {sent}, с ошибкой: {failed}')
+            if not options['loop']:
+                return
+            if not sent and not failed:
+                time.sleep(options['interval'])
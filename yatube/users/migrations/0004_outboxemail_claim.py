@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='claim',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Contact(models.Model):
@@ -7,3 +8,53 @@ class Contact(models.Model):
     subject = models.CharField(max_length=100)
     body = models.TextField()
     is_answered = models.BooleanField(default=False)
+
+
+class OutboxEmail(models.Model):
+    """Письмо в очереди на отправку. Отправляет команда send_outbox."""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    # Адреса получателей, по одному на строку.
+    recipients = models.TextField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Метка отправителя, захватившего письмо: по ней он находит пачку,
+    # которую выиграл у других отправителей.
+    claim = models.CharField(max_length=32, blank=True, db_index=True,
+                             editable=False)
+
+    class Meta:
+        ordering = ('next_attempt',)
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+
+    def __str__(self):
+        return self.subject
+
+
+class AccountDeletion(models.Model):
+    """Удаление аккаунта в фоне, пачками; хранит прогресс для продолжения.
+
+    Ссылки на пользователя нет: запись переживает удаление аккаунта.
+    """
+    user_id = models.IntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    requested = models.DateTimeField(auto_now_add=True)
+    # Текущий шаг из users.deletion.STAGES и последний удаленный pk.
+    stage = models.PositiveSmallIntegerField(default=0)
+    last_pk = models.BigIntegerField(default=0)
+    deleted_rows = models.PositiveIntegerField(default=0)
+    finished = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ('requested',)
+        verbose_name = 'Удаление аккаунта'
+        verbose_name_plural = 'Удаления аккаунтов'
+
+    def __str__(self):
+        return self.username
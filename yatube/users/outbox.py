@@ -0,0 +1,88 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def enqueue_mail(subject, message, from_email, recipient_list,
+                 html_message=None):
+    """Ставит письмо в очередь. Аналог send_mail, но ничего не отправляет."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or '',
+        recipients='\n'.join(recipient_list),
+    )
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject,
+        email.body,
+        email.from_email or None,
+        email.recipients.splitlines(),
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def claim_batch(batch_size, now):
+    """Захватывает пачку готовых к отправке писем.
+
+    Один UPDATE с тем же условием, что и выборка, метит письма и
+    откладывает их на OUTBOX_CLAIM_TIMEOUT. Письма, которые успел
+    захватить параллельный отправитель, под условие уже не попадают,
+    поэтому каждое письмо достается одному отправителю.
+    """
+    ready = OutboxEmail.objects.filter(
+        sent__isnull=True,
+        next_attempt__lte=now,
+        attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+    )
+    ids = list(ready.values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    ready.filter(pk__in=ids).update(
+        claim=claim,
+        next_attempt=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT),
+    )
+    return list(OutboxEmail.objects.filter(claim=claim))
+
+
+def deliver_outbox(batch_size=None, connection=None):
+    """Отправляет пачку писем через одно соединение с почтовым сервером.
+
+    Неудачные письма откладываются с экспоненциально растущей паузой,
+    после OUTBOX_MAX_ATTEMPTS попыток остаются в таблице с ошибкой.
+    Возвращает пару (отправлено, не отправлено).
+    """
+    now = timezone.now()
+    batch = claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE, now)
+    if not batch:
+        return 0, 0
+    sent = failed = 0
+    with connection or get_connection() as connection:
+        for email in batch:
+            email.attempts += 1
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as error:
+                delay = settings.OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+                email.next_attempt = now + timedelta(seconds=delay)
+                email.last_error = str(error)
+                failed += 1
+            else:
+                email.sent = timezone.now()
+                email.last_error = ''
+                sent += 1
+            email.save(update_fields=(
+                'attempts', 'next_attempt', 'last_error', 'sent'))
+    return sent, failed
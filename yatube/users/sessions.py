@@ -0,0 +1,56 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.backends.cached_db import \
+    SessionStore as CachedDBStore
+
+# Сессии, выданные до перехода на CachedModelBackend, хранят путь
+# стандартного бэкенда; без подмены такие пользователи вылетели бы.
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend':
+        'users.backends.CachedModelBackend',
+}
+
+
+class SessionStore(CachedDBStore):
+    """Сессии в кеше с записью в базу только при изменении данных.
+
+    Любое изменение данных сессии сразу пишется и в базу, и в кеш, так
+    что вытеснение из кеша ничего не теряет. Пропускаются только
+    сохранения, после которых данные остались прежними: хеш того, что
+    лежит в базе, хранится в кеше рядом с сессией.
+    """
+    cache_key_prefix = 'users.sessions'
+
+    @property
+    def synced_key(self):
+        return self.cache_key + ':synced'
+
+    def load(self):
+        session = super().load()
+        backend = session.get(BACKEND_SESSION_KEY)
+        if (backend in LEGACY_BACKENDS
+                and backend not in settings.AUTHENTICATION_BACKENDS):
+            session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend]
+            self.modified = True
+        return session
+
+    def state(self):
+        return hashlib.md5(
+            self.encode(self._get_session()).encode('ascii')).hexdigest()
+
+    def save(self, must_create=False):
+        state = self.state()
+        if (must_create or self.session_key is None
+                or self._cache.get(self.synced_key) != state):
+            super().save(must_create)
+            self._cache.set(self.synced_key, state, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        if session_key is None and self.session_key is not None:
+            session_key = self.session_key
+        if session_key is not None:
+            self._cache.delete(
+                self.cache_key_prefix + session_key + ':synced')
+        super().delete(session_key)
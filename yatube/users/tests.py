@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model)
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post, ProfileStats
+from users.deletion import purge_accounts, purge_batch, request_deletion
+from users.models import AccountDeletion, OutboxEmail
+from users.outbox import claim_batch, deliver_outbox, enqueue_mail
+from users.sessions import SessionStore
+
+User = get_user_model()
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+class OutboxTests(TestCase):
+    def test_password_reset_is_queued(self):
+        """Сброс пароля ставит письмо в очередь, не отправляя его."""
+        User.objects.create_user(username='reset', email='reset@example.com',
+                                 password='pass12345')
+        self.client.post(reverse('users:password_reset'),
+                         {'email': 'reset@example.com'})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_deliver_sends_batch(self):
+        """Очередь отправляется одной пачкой."""
+        for i in range(3):
+            enqueue_mail(f'Тема {i}', 'Текст', None, ['to@example.com'])
+        self.assertEqual(deliver_outbox(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxEmail.objects.filter(sent=None).exists())
+
+    def test_failed_mail_is_retried_later(self):
+        """Неотправленное письмо откладывается на следующую попытку."""
+        email = enqueue_mail('Тема', 'Текст', None, ['to@example.com'])
+        self.assertEqual(deliver_outbox(connection=FailingBackend()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt, email.created)
+        self.assertEqual(deliver_outbox(), (0, 0))
+
+    def test_claimed_mail_is_not_sent_twice(self):
+        """Письма, захваченные одним отправителем, не берет другой."""
+        for i in range(3):
+            enqueue_mail(f'Тема {i}', 'Текст', None, ['to@example.com'])
+        claimed = claim_batch(2, timezone.now())
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(deliver_outbox(), (1, 0))
+        self.assertEqual(deliver_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        self.session = SessionStore()
+        self.session['cart'] = 1
+        self.session.save()
+
+    def test_changes_reach_database(self):
+        """Изменение данных сессии сразу пишется в базу."""
+        self.session['cart'] = 2
+        self.session.save()
+        cache.clear()
+        self.assertEqual(
+            SessionStore(self.session.session_key)['cart'], 2)
+
+    def test_legacy_backend_session_stays_logged_in(self):
+        """Сессия со старым путем ModelBackend не разлогинивается."""
+        user = User.objects.create_user(username='legacy')
+        session = SessionStore()
+        session.update({
+            SESSION_KEY: str(user.pk),
+            BACKEND_SESSION_KEY: 'django.contrib.auth.backends.ModelBackend',
+            HASH_SESSION_KEY: user.get_session_auth_hash(),
+        })
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = (
+            session.session_key)
+        response = self.client.get(reverse('about:author'))
+        self.assertEqual(response.context['user'], user)
+
+    def test_unchanged_session_is_not_written(self):
+        """Сохранение без изменений не обращается к базе."""
+        session = SessionStore(self.session.session_key)
+        session['cart'] = 1
+        with self.assertNumQueries(0):
+            session.save()
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached',
+                                             password='pass12345')
+        self.client.login(username='cached', password='pass12345')
+
+    def test_authenticated_request_without_queries(self):
+        """Сессия и пользователь берутся из кеша."""
+        url = reverse('about:author')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_user_save_invalidates_cache(self):
+        """Смена пароля сбрасывает кеш и разлогинивает сессию."""
+        url = reverse('about:author')
+        self.client.get(url)
+        self.user.set_password('new-pass12345')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='leaving',
+                                             password='pass12345')
+        self.other = User.objects.create_user(username='staying')
+        self.posts = [Post.objects.create(text=f'Пост {i}', author=self.user)
+                      for i in range(3)]
+        other_post = Post.objects.create(text='Чужой', author=self.other)
+        Comment.objects.create(post=self.posts[0], author=self.other,
+                               text='Комментарий к удаляемому посту')
+        Comment.objects.create(post=other_post, author=self.user,
+                               text='Комментарий удаляемого автора')
+        Follow.objects.create(user=self.other, author=self.user)
+        self.client.force_login(self.user)
+
+    def test_account_is_hidden_immediately(self):
+        """После запроса аккаунт скрыт, а данные еще не удалены."""
+        self.client.post(reverse('users:delete_account'))
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.posts[0].pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Post.objects.filter(author=self.user).count(), 3)
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_cached_pages_hide_account(self):
+        """Закешированные страницы постов скрывают аккаунт без перебора
+        его постов в запросе."""
+        self.client.logout()
+        url = reverse('posts:post_detail', args=[self.posts[0].pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            request_deletion(self.user)
+        self.assertFalse(any(
+            'SELECT "posts_post"."id"' in query['sql']
+            for query in queries.captured_queries))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_hidden_account_leaves_comments_and_follows(self):
+        """Комментарии и подписки скрытого аккаунта не видны до удаления."""
+        request_deletion(self.user)
+        other_post = Post.objects.get(author=self.other)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[other_post.pk]))
+        self.assertNotContains(response, 'Комментарий удаляемого автора')
+        response = self.client.get(
+            reverse('posts:following', args=[self.other.username]))
+        self.assertNotContains(response, self.user.username)
+
+    def test_purge_removes_everything(self):
+        """Фоновое удаление убирает аккаунт и все зависимые строки."""
+        self.client.post(reverse('users:delete_account'))
+        self.assertEqual(purge_accounts(batch_size=2), 1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Comment.objects.all()), [])
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(ProfileStats.objects.get(
+            user=self.other).following_count, 0)
+        deletion = AccountDeletion.objects.get()
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual(deletion.deleted_rows, 6)
+
+    def test_purge_resumes_from_progress(self):
+        """Прерванное удаление продолжается с сохраненного места."""
+        self.client.post(reverse('users:delete_account'))
+        deletion = AccountDeletion.objects.get()
+        for _ in range(7):
+            purge_batch(deletion, batch_size=1)
+        deletion.refresh_from_db()
+        self.assertGreater(deletion.stage, 0)
+        purge_accounts(batch_size=1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
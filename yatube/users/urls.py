@@ -8,11 +8,13 @@ from django.contrib.auth.views import (LoginView, LogoutView,
 from django.urls import path
 
 from . import views
+from .forms import OutboxPasswordResetForm
 
 app_name = 'users'
 
 urlpatterns = [
     path('signup/', views.SignUp.as_view(), name='signup'),
+    path('delete/', views.delete_account, name='delete_account'),
     path(
         'login/',
         LoginView.as_view(template_name='users/login.html'),
@@ -40,7 +42,8 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view(
-            template_name='users/password_reset_form.html'
+            template_name='users/password_reset_form.html',
+            form_class=OutboxPasswordResetForm,
         ),
         name='password_reset'
     ),
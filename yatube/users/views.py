@@ -1,8 +1,10 @@
-from django.core.mail import send_mail
+from django.contrib.auth import logout
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 
+from .deletion import request_deletion
 from .forms import ContactForm, CreationForm
 
 
@@ -12,13 +14,13 @@ class SignUp(CreateView):
     template_name = 'users/signup.html'
 
 
-send_mail(
-    'Тема письма',
-    'Текст письма.',
-    'from@example.com',  # Это поле "От кого"
-    ['to@example.com'],  # Это поле "Кому" (можно указать список адресов)
-    fail_silently=False
-)
+@login_required
+def delete_account(request):
+    if request.method == 'POST':
+        request_deletion(request.user)
+        logout(request)
+        return redirect('posts:index')
+    return render(request, 'users/delete_account.html')
 
 
 def only_user_view(request):
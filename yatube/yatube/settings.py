@@ -32,11 +32,63 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+# L1 - LRU в памяти процесса, L2 - файл SQLite, общий для всех
+# процессов на машине; см. core.cache_backends.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_CHECK_INTERVAL': 1.0,
+        },
     }
 }
+# Тесты переводят кеш во временный файл и удаляют его по окончании
+# прогона (core.testing.isolated_cache).
+TEST_RUNNER = 'core.testing.IsolatedCacheRunner'
+
+# Сессии и пользователь сессии берутся из кеша, без запросов к базе.
+SESSION_ENGINE = 'users.sessions'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = 60 * 5
+
+# Страницы в cache_page_swr: сколько секунд отдавать устаревшую копию,
+# пока один запрос ее пересобирает, и на сколько брать блокировку.
+PAGE_CACHE_STALE_TIMEOUT = 60 * 5
+# Страницы групп, профилей и постов сбрасываются при изменении данных,
+# поэтому могут жить в кеше дольше главной.
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Лента подписок кешируется для каждого читателя под версиями его
+# авторов (posts.pages.feed_prefixes).
+FEED_CACHE_TIMEOUT = 60 * 10
+# Сколько строк читать за раз, когда страницы сбрасываются по списку
+# объектов (импорт подписок, посты с комментариями пользователя).
+INVALIDATION_BATCH_SIZE = 1000
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Адреса, которые `python manage.py warm_caches` прогревает всегда.
+CACHE_WARM_URLS = ['/']
+# Хост, под которым сайт виден пользователям: он входит в ключ кеша.
+CACHE_WARM_HOST = 'localhost'
+
+# Сжатие ответов: минимальный размер в байтах, уровень gzip (1-9)
+# и качество brotli (0-11), если он установлен.
+COMPRESSION_MIN_SIZE = 200
+COMPRESSION_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Ограничение частоты запросов к изменяющим URL: 'число/s|m|h|d'
+# на пользователя, а для анонимов - на IP. Считаются POST, PUT, PATCH
+# и DELETE; подписка меняет данные по GET, поэтому методы указаны явно.
+RATELIMITS = {
+    'posts:add_comment': '10/m',
+    'posts:post_create': '20/m',
+    'posts:profile_follow': ('30/m', ('GET', 'POST')),
+    'posts:profile_unfollow': ('30/m', ('GET', 'POST')),
+}
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -62,8 +114,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -143,10 +198,22 @@ USE_TZ = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Как отдавать медиафайлы: None - из Django, 'x-sendfile' (Apache,
+# lighttpd) или 'x-accel-redirect' (nginx, internal location
+# MEDIA_ACCEL_PREFIX с alias на MEDIA_ROOT).
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Файлы с хешем в имени кешируются браузером навсегда.
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
 
 # Добавили статик.
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# collectstatic складывает сюда файлы с хешем в имени, манифест
+# и сжатые .gz/.br-варианты (brotli - если установлен).
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStorage'
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
 
 # Добавили базу данных.
 DATABASES = {
@@ -156,7 +223,57 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения. Локально это вторая SQLite-база,
+# которую обновляет команда `python manage.py sync_replica`.
+DATABASE_REPLICAS = []
+if os.getenv('YATUBE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# Сколько секунд после записи читать только из основной базы.
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE_NAME = 'primary_pin'
+
+# Посты старше этого срока переносятся в архив (`archive_posts`).
+ARCHIVE_AFTER_DAYS = 365
+# Архивные страницы не меняются, их можно кешировать надолго.
+ARCHIVE_CACHE_SECONDS = 60 * 60 * 24 * 365
+
+# Рекомендации подписок (`build_suggestions`).
+SUGGESTIONS_COUNT = 5
+SUGGESTIONS_CO_WEIGHT = 0.2
+SUGGESTIONS_MAX_CO_FOLLOWERS = 200
+
+# Лента популярного (/trending/): рейтинг поста растет от комментариев
+# и просмотров и затухает вдвое за TRENDING_HALF_LIFE_HOURS
+# (`python manage.py decay_trending` раз в час).
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_COMMENT_WEIGHT = 1.0
+TRENDING_VIEW_WEIGHT = 0.05
+# Просмотры копятся в кеше и пишутся в базу пачками.
+TRENDING_VIEWS_PER_WRITE = 10
+TRENDING_MIN_SCORE = 0.01
+TRENDING_SIZE = 100
+
+# Админка: начиная с этого числа строк по статистике базы
+# changelist показывает оценку вместо точного COUNT(*).
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 100000
+# Сколько секунд кешировать точные счетчики и списки выбора админки.
+ADMIN_COUNT_CACHE_SECONDS = 60
+ADMIN_CHOICES_CACHE_SECONDS = 60 * 5
+
+# Кеш процесса для групп по slug, авторов по username и владельцев
+# постов (posts.lookups). Сброс доходит до всех процессов через общий кеш.
+LOOKUP_CACHE_SIZE = 1000
+LOOKUP_CACHE_TTL = 60
+
 PAGE_SIZE = (10)
+# Пагинатор сайта считает записи не дальше этого предела.
+PAGINATOR_MAX_COUNT = 10000
 POST_TEST_COUNT = (13)
 COUNT_TEXT = (15)
 CHARACTER_LIMIT_IN_TITLE = (30)
@@ -168,6 +285,19 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+# Удаление аккаунтов: `python manage.py purge_accounts --loop`
+# удаляет данные скрытых аккаунтов пачками такого размера.
+ACCOUNT_DELETION_BATCH_SIZE = 500
+
+# Очередь писем: views только ставят письма в очередь,
+# отправляет их `python manage.py send_outbox --loop`.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+# Пауза перед повтором в секундах, удваивается с каждой попыткой.
+OUTBOX_RETRY_DELAY = 60
+# На столько секунд отправитель захватывает пачку писем; если он упал,
+# письма после этого подберет другой.
+OUTBOX_CLAIM_TIMEOUT = 60 * 10
 
 
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'